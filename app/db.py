@@ -1,6 +1,6 @@
 # app/db.py
 import sqlite3
-import numpy as np
+from .vectors import decode_vector
 
 # Updated Schema for Phase 1.5
 SCHEMA = """
@@ -19,10 +19,29 @@ CREATE TABLE IF NOT EXISTS memories (
     vision_status TEXT,
     embedding BLOB,
     thumbnail BLOB,
-    schema_version INTEGER DEFAULT 2
+    schema_version INTEGER DEFAULT 2,
+    phash TEXT,
+    dup_of TEXT,
+    event_id INTEGER
 );
 CREATE INDEX IF NOT EXISTS idx_hash ON memories(hash);
 CREATE INDEX IF NOT EXISTS idx_path ON memories(path);
+CREATE INDEX IF NOT EXISTS idx_phash ON memories(phash);
+CREATE INDEX IF NOT EXISTS idx_exif_date ON memories(exif_date, file_id);
+CREATE INDEX IF NOT EXISTS idx_event ON memories(event_id);
+
+-- Precomputed clusters of memories for the Timeline / Chronicle views (app/events.py)
+CREATE TABLE IF NOT EXISTS events (
+    event_id INTEGER PRIMARY KEY,
+    start_date TEXT,
+    end_date TEXT,
+    size INTEGER,
+    centroid BLOB,
+    representative_id TEXT,
+    summary TEXT,
+    tags TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_start ON events(start_date, event_id);
 
 CREATE TABLE IF NOT EXISTS vision_config (
     id INTEGER PRIMARY KEY CHECK (id = 1),
@@ -30,6 +49,20 @@ CREATE TABLE IF NOT EXISTS vision_config (
     model_name TEXT,
     api_key TEXT
 );
+
+-- Per-model embeddings written by re-embedding jobs; the active model's vectors
+-- are copied into memories.embedding when a job swaps in
+CREATE TABLE IF NOT EXISTS embedding_versions (
+    model TEXT,
+    file_id TEXT,
+    vector BLOB,
+    PRIMARY KEY (model, file_id)
+);
+
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
 """
 
 def init_db(db_path: str):
@@ -44,6 +77,19 @@ def init_db(db_path: str):
         # Columns missing, run migration
         _migrate_to_phase_1_5(conn)
 
+    try:
+        conn.execute("SELECT phash FROM memories LIMIT 1")
+    except sqlite3.OperationalError:
+        _migrate_add_phash(conn)
+
+    try:
+        conn.execute("SELECT event_id FROM memories LIMIT 1")
+    except sqlite3.OperationalError:
+        try:
+            conn.execute("ALTER TABLE memories ADD COLUMN event_id INTEGER")
+            conn.commit()
+        except sqlite3.OperationalError: pass
+
     cur = conn.cursor()
     cur.executescript(SCHEMA)
     conn.commit()
@@ -65,7 +111,25 @@ def _migrate_to_phase_1_5(conn):
 
     conn.commit()
 
-def row_to_dict(row):
+def _migrate_add_phash(conn):
+    # Perceptual hash (near-duplicate detection) + the file_id results were reused from
+    for col in ("phash TEXT", "dup_of TEXT"):
+        try:
+            conn.execute(f"ALTER TABLE memories ADD COLUMN {col}")
+        except sqlite3.OperationalError: pass
+    conn.commit()
+
+def get_setting(conn, key, default=None):
+    cur = conn.cursor()
+    cur.execute("SELECT value FROM settings WHERE key=?", (key,))
+    row = cur.fetchone()
+    return row[0] if row else default
+
+def set_setting(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+    conn.commit()
+
+def row_to_dict(row, dim=384):
     # row expected: file_id, path, hash, created_at, modified_at, exif_date, ocr_text, caption, memory_summary, tags, vision_json, vision_status, embedding, thumbnail, schema_version...
     if not row:
         return None
@@ -91,7 +155,7 @@ def row_to_dict(row):
     if len(row) > 11:
         d["vision_status"] = row[11]
     if len(row) > 12:
-        d["embedding"] = np.frombuffer(row[12], dtype=np.float32) if row[12] else None
+        d["embedding"] = decode_vector(row[12], dim)
     if len(row) > 13:
         d["thumbnail"] = row[13]
 
@@ -0,0 +1,99 @@
+# app/embedding.py
+"""
+Background loading of the sentence embedding model.
+
+sentence-transformers pulls in torch, which dominates process start-up. Loading it
+on a worker thread lets the API answer /livez immediately while the model warms up.
+"""
+import os
+import time
+import threading
+
+# Process-wide model used to embed queries and new scans. Each library records the model
+# its stored vectors came from; switching models needs a re-embed (python -m app.reembed).
+# The vector size is read from the model itself once it has loaded.
+MODEL_NAME = os.environ.get("RECALLBOX_EMBED_MODEL", "all-MiniLM-L6-v2")
+# What every library was built with before the model was recorded
+LEGACY_MODEL_NAME = "all-MiniLM-L6-v2"
+LEGACY_EMBED_DIM = 384
+
+# torch | torch-int8 | onnx | onnx-int8
+EMBED_BACKEND = os.environ.get("RECALLBOX_EMBED_BACKEND", "torch")
+# Quantized ONNX export shipped in the all-MiniLM-L6-v2 hub repo; pick the one matching the CPU
+ONNX_INT8_FILE = os.environ.get("RECALLBOX_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+
+
+def embedding_text(caption, summary, tags, ocr, vision_status):
+    """The text a memory is embedded from; shared by the indexer and re-embedding."""
+    if vision_status == "success":
+        # Embed based on vision
+        return f"{summary} {tags} {ocr}"
+    return f"{caption} {summary} {ocr}"
+
+
+def load_sentence_model(model_name: str, backend: str = EMBED_BACKEND):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "torch-int8":
+        import torch
+        model = SentenceTransformer(model_name, device="cpu")
+        # Dynamic int8 quantization of the Linear layers; CPU only
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+    if backend == "onnx-int8":
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": ONNX_INT8_FILE})
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+class BackgroundModel:
+    """Loads and warms up the embedding model once, on a daemon thread."""
+
+    def __init__(self, model_name: str, backend: str = EMBED_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        self.model = None
+        self.dim = None
+        self.status = "idle"
+        self.error = None
+        self.load_seconds = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.status != "idle":
+                return self
+            self.status = "loading"
+        threading.Thread(target=self._load, name="embed-model-loader", daemon=True).start()
+        return self
+
+    def _load(self):
+        t0 = time.perf_counter()
+        try:
+            model = load_sentence_model(self.model_name, self.backend)
+            # First encode allocates buffers / builds kernels; pay for it here, not on the first search
+            model.encode("warm up")
+            self.dim = int(model.get_sentence_embedding_dimension())
+            self.model = model
+            self.status = "ready"
+            print(f"Embedding model {self.model_name} ({self.backend}) ready in {time.perf_counter() - t0:.1f}s")
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+            print(f"Failed loading embedding model: {e}")
+        finally:
+            self.load_seconds = time.perf_counter() - t0
+            self._ready.set()
+
+    def wait(self, timeout=None):
+        """Return the model once loaded, or None if still loading after `timeout` or failed."""
+        self.start()
+        self._ready.wait(timeout)
+        return self.model
+
+    def info(self):
+        return {"model": self.model_name, "backend": self.backend, "status": self.status,
+                "dim": self.dim, "error": self.error, "load_seconds": self.load_seconds}
@@ -0,0 +1,198 @@
+# app/events.py
+"""
+Precomputed "events": runs of memories close in time and in content.
+
+Memories are walked in exif_date order. A gap longer than EVENT_MAX_GAP always starts
+a new event, a gap shorter than EVENT_MIN_GAP never does, and in between the photo joins
+the current event only if its embedding is close enough to the event centroid. This is
+agglomerative clustering restricted to time-adjacent neighbours, so it runs in one
+streaming pass and can be redone from any event boundary after a scan.
+"""
+from datetime import datetime, timedelta
+from collections import Counter
+from contextlib import nullcontext
+
+import numpy as np
+
+from .vectors import decode_vector
+
+EVENT_MIN_GAP = timedelta(minutes=30)
+EVENT_MAX_GAP = timedelta(hours=6)
+# Cosine similarity to the running centroid needed to bridge a mid-sized gap
+EVENT_SIMILARITY = 0.45
+READ_BATCH = 2000
+# event_id for memories whose date can't be parsed, so they aren't retried on every update
+NO_EVENT = -1
+
+
+def _parse(ts):
+    try:
+        return datetime.fromisoformat(ts)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Event:
+    def __init__(self):
+        self.members = []  # (file_id, exif_date, unit vector or None, tags)
+        self.vec_sum = None
+
+    @property
+    def end(self):
+        return self.members[-1][1]
+
+    def centroid(self):
+        if self.vec_sum is None:
+            return None
+        n = np.linalg.norm(self.vec_sum)
+        return self.vec_sum / n if n else None
+
+    def accepts(self, when, vec):
+        gap = when - self.end
+        if gap <= EVENT_MIN_GAP:
+            return True
+        if gap > EVENT_MAX_GAP:
+            return False
+        c = self.centroid()
+        if c is None or vec is None:
+            return False
+        return float(np.dot(c, vec)) >= EVENT_SIMILARITY
+
+    def add(self, fid, when, vec, tags):
+        self.members.append((fid, when, vec, tags))
+        if vec is not None:
+            self.vec_sum = vec.copy() if self.vec_sum is None else self.vec_sum + vec
+
+    def summary_row(self):
+        c = self.centroid()
+        # Representative: the member most similar to the centroid (first one if no vectors)
+        rep = self.members[0][0]
+        if c is not None:
+            best = -2.0
+            for fid, _, vec, _ in self.members:
+                if vec is not None:
+                    sim = float(np.dot(c, vec))
+                    if sim > best:
+                        best, rep = sim, fid
+        tag_counts = Counter()
+        for _, _, _, tags in self.members:
+            for t in (tags or "").split(","):
+                t = t.strip()
+                if t and t != "ocr-fallback":
+                    tag_counts[t] += 1
+        top_tags = ", ".join(t for t, _ in tag_counts.most_common(5))
+        return (self.members[0][1].isoformat(), self.end.isoformat(), len(self.members),
+                c.astype("float32").tobytes() if c is not None else None, rep, top_tags)
+
+
+def _closed(read, event):
+    """Summary row and member ids of a finished event, so the pass doesn't keep every vector."""
+    start, end, size, centroid, rep, tags = event.summary_row()
+    read.execute("SELECT memory_summary FROM memories WHERE file_id=?", (rep,))
+    row = read.fetchone()
+    return (start, end, size, centroid, rep, row[0] if row else None, tags), [m[0] for m in event.members]
+
+
+def _cluster(read_conn, dim, full):
+    """
+    Read pass: work out the new events without writing anything.
+    Returns (since, events, undated), with since=None for a full rebuild, or None if
+    there is nothing to do.
+    """
+    c = read_conn.cursor()
+    since = None
+    if not full:
+        c.execute("SELECT MIN(exif_date) FROM memories WHERE event_id IS NULL AND exif_date IS NOT NULL")
+        first_new = c.fetchone()[0]
+        if first_new is None:
+            return None
+        first_dt = _parse(first_new)
+        if first_dt is not None:
+            # Restart from the event that could absorb the earliest new memory
+            c.execute("SELECT MIN(start_date) FROM events WHERE end_date >= ?",
+                      ((first_dt - EVENT_MAX_GAP).isoformat(),))
+            start = c.fetchone()[0]
+            since = min(start, first_new) if start else first_new
+
+    read = read_conn.cursor()
+    if since is None:
+        read.execute("SELECT file_id, exif_date, embedding, tags FROM memories WHERE exif_date IS NOT NULL ORDER BY exif_date, file_id")
+    else:
+        read.execute("SELECT file_id, exif_date, embedding, tags FROM memories WHERE exif_date >= ? ORDER BY exif_date, file_id", (since,))
+
+    events = []
+    current = None
+    undated = []
+    while True:
+        rows = read.fetchmany(READ_BATCH)
+        if not rows:
+            break
+        for fid, exif_date, blob, tags in rows:
+            when = _parse(exif_date)
+            if when is None:
+                undated.append((NO_EVENT, fid))
+                continue
+            vec = decode_vector(blob, dim)
+            if vec is not None:
+                n = np.linalg.norm(vec)
+                vec = vec / n if n else None
+            if current is None or not current.accepts(when, vec):
+                if current is not None:
+                    events.append(_closed(c, current))
+                current = _Event()
+            current.add(fid, when, vec, tags)
+    if current is not None:
+        events.append(_closed(c, current))
+    return since, events, undated
+
+
+def _write(conn, since, events, undated):
+    c = conn.cursor()
+    with conn:
+        if since is None:
+            c.execute("DELETE FROM events")
+            c.execute("UPDATE memories SET event_id=NULL")
+        else:
+            c.execute("DELETE FROM events WHERE start_date >= ?", (since,))
+            c.execute("UPDATE memories SET event_id=NULL WHERE exif_date >= ?", (since,))
+        for row, members in events:
+            c.execute("""INSERT INTO events (start_date, end_date, size, centroid, representative_id, summary, tags)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)""", row)
+            event_id = c.lastrowid
+            c.executemany("UPDATE memories SET event_id=? WHERE file_id=?", [(event_id, fid) for fid in members])
+        if undated:
+            c.executemany("UPDATE memories SET event_id=? WHERE file_id=?", undated)
+    return sum(len(members) for _, members in events)
+
+
+def update_events(conn, dim, full=False, lock=None, read_conn=None, attempts=3):
+    """
+    Bring the events table up to date. Incremental by default: only events that could
+    touch memories not yet assigned to an event (new or rescanned) are recomputed.
+    Returns the number of memories (re)clustered.
+
+    With `read_conn` (a second connection to the same DB) the clustering pass runs there
+    and `lock`, the lock guarding writes on `conn`, is only held for the short write
+    transaction. If anything was committed while the pass ran it is redone; the last
+    attempt holds `lock` throughout.
+    """
+    lock = lock or nullcontext()
+    if read_conn is None:
+        with lock:
+            plan = _cluster(conn, dim, full)
+            return _write(conn, *plan) if plan else 0
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        with lock if last else nullcontext():
+            version = read_conn.execute("PRAGMA data_version").fetchone()[0]
+            # One read transaction, so the pass sees a single snapshot
+            read_conn.execute("BEGIN")
+            try:
+                plan = _cluster(read_conn, dim, full)
+            finally:
+                read_conn.rollback()
+            if plan is None:
+                return 0
+            with nullcontext() if last else lock:
+                if last or read_conn.execute("PRAGMA data_version").fetchone()[0] == version:
+                    return _write(conn, *plan)
@@ -2,59 +2,112 @@
 import faiss
 import numpy as np
 
+from .vectors import decode_vector, DEFAULT_VECTOR_FORMAT
+
+# QT_8bit learns a per-dimension [min, max] from its training vectors. Until a library has
+# this many real vectors they are kept unquantized and searched exactly, rather than
+# quantized against a guessed range.
+SQ_TRAIN_MIN = 1000
+
 class FaissManager:
-    def __init__(self, dim):
+    """
+    storage: "float32" keeps an exact IndexFlatL2; "float16" / "int8" use an
+    IndexScalarQuantizer holding 2 / 1 bytes per dimension.
+    """
+    def __init__(self, dim, storage=DEFAULT_VECTOR_FORMAT):
         self.dim = dim
-        self.index = faiss.IndexFlatL2(dim)
+        self.storage = storage
+        self.index = self._new_index()
         self.ids = []  # list of tuples (file_id, path)
+        # Vectors waiting for an untrained (int8) index to have enough data to train on
+        self.pending = []
+        self.pending_ids = []
+
+    def _new_index(self):
+        if self.storage == "float16":
+            return faiss.IndexScalarQuantizer(self.dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+        if self.storage == "int8":
+            return faiss.IndexScalarQuantizer(self.dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+        return faiss.IndexFlatL2(self.dim)
+
+    def _ensure_trained(self, sample):
+        if not self.index.is_trained:
+            self.index.train(sample)
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal + len(self.pending)
 
     def reset(self):
-        self.index = faiss.IndexFlatL2(self.dim)
+        self.index = self._new_index()
         self.ids = []
+        self.pending = []
+        self.pending_ids = []
 
     def build_from_db(self, conn):
         c = conn.cursor()
         c.execute("SELECT file_id, path, embedding FROM memories")
         rows = c.fetchall()
         vecs = []
-        self.ids = []
+        ids = []
+        mismatched = 0
         for fid, path, emb_blob in rows:
-            if emb_blob:
-                arr = np.frombuffer(emb_blob, dtype=np.float32)
-                if arr.size == self.dim:
-                    vecs.append(arr)
-                    self.ids.append((fid, path))
-        if vecs:
+            arr = decode_vector(emb_blob, self.dim)
+            if arr is not None:
+                vecs.append(arr)
+                ids.append((fid, path))
+            elif emb_blob:
+                mismatched += 1
+        if mismatched:
+            print(f"FAISS: skipped {mismatched} embeddings whose size doesn't match dim={self.dim}; re-embed to include them")
+        self.reset()
+        if not vecs:
+            return
+        if self.index.is_trained or len(vecs) >= SQ_TRAIN_MIN:
             mat = np.vstack(vecs).astype("float32")
-            self.index.reset()
+            self._ensure_trained(mat)
             self.index.add(mat)
+            self.ids = ids
         else:
-            self.reset()
+            self.pending = [v.astype("float32") for v in vecs]
+            self.pending_ids = ids
 
     def add_vector(self, vec, id_tuple):
         # vec: numpy float32 vector
         if vec is None:
             return
-        if hasattr(vec, "reshape"):
-            arr = np.array(vec).astype("float32").reshape(1, -1)
-        else:
-            arr = np.array(vec, dtype="float32").reshape(1, -1)
-        if self.index.ntotal == 0:
-            self.index.add(arr)
-            self.ids.append(id_tuple)
-        else:
-            # append to index. IndexFlatL2 supports add
-            self.index.add(arr)
-            self.ids.append(id_tuple)
+        arr = np.array(vec, dtype="float32").reshape(1, -1)
+        if not self.index.is_trained:
+            # Held unquantized until there are enough real vectors to learn the 8-bit ranges from
+            self.pending.append(arr[0])
+            self.pending_ids.append(id_tuple)
+            if len(self.pending) >= SQ_TRAIN_MIN:
+                mat = np.vstack(self.pending)
+                self._ensure_trained(mat)
+                self.index.add(mat)
+                self.ids.extend(self.pending_ids)
+                self.pending, self.pending_ids = [], []
+            return
+        # append to index. IndexFlatL2 and IndexScalarQuantizer both support add
+        self.index.add(arr)
+        self.ids.append(id_tuple)
 
     def search(self, qvec, topk=10):
-        if self.index.ntotal == 0:
-            return []
-        D, I = self.index.search(np.array([qvec]).astype("float32"), topk)
+        q = np.array([qvec]).astype("float32")
         results = []
-        for dist, idx in zip(D[0], I[0]):
-            if idx == -1:
-                continue
-            fid, path = self.ids[idx]
-            results.append({"file_id": fid, "path": path, "score": float(dist)})
+        if self.index.ntotal:
+            D, I = self.index.search(q, topk)
+            for dist, idx in zip(D[0], I[0]):
+                if idx == -1:
+                    continue
+                fid, path = self.ids[idx]
+                results.append({"file_id": fid, "path": path, "score": float(dist)})
+        if self.pending:
+            # Exact search over the not-yet-quantized vectors
+            dists = ((np.vstack(self.pending) - q) ** 2).sum(axis=1)
+            for idx in np.argsort(dists)[:topk]:
+                fid, path = self.pending_ids[idx]
+                results.append({"file_id": fid, "path": path, "score": float(dists[idx])})
+            results.sort(key=lambda r: r["score"])
+            results = results[:topk]
         return results
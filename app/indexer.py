@@ -1,15 +1,21 @@
 # app/indexer.py
 import os
+import sqlite3
 import hashlib
 import io
 import uuid
 import asyncio
 from pathlib import Path
+from contextlib import nullcontext
 from PIL import Image, ImageOps
 import pytesseract
 import numpy as np
 from tqdm import tqdm
-from .db import row_to_dict
+from .db import row_to_dict, get_setting
+from .vectors import encode_vector, decode_vector, DEFAULT_VECTOR_FORMAT
+from .embedding import embedding_text
+from .phash import BKTree, dhash, backfill_phashes, verify_near_duplicate, REUSE_DISTANCE
+from .metrics import span, SCAN_FILES, SCAN_QUEUE_DEPTH
 from datetime import datetime
 import json
 
@@ -24,19 +30,25 @@ def file_hash(path: Path):
     return h.hexdigest()
 
 def make_thumbnail_bytes(path: Path, size=THUMB_SIZE):
+    return make_thumbnail_and_phash(path, size)[0]
+
+def make_thumbnail_and_phash(path: Path, size=THUMB_SIZE):
+    """Returns (jpeg_bytes, phash). phash is None if the image could not be decoded."""
     try:
         im = Image.open(path)
         im = ImageOps.exif_transpose(im)
         im.thumbnail(size)
+        # Hash the thumbnail rather than the original: dHash downsamples to 9x8 anyway
+        ph = dhash(im)
         buf = io.BytesIO()
         im.convert("RGB").save(buf, format="JPEG", quality=85)
-        return buf.getvalue()
+        return buf.getvalue(), ph
     except Exception:
         # generate blank
         im = Image.new("RGB", size, (100,100,100))
         buf = io.BytesIO()
         im.save(buf, format="JPEG", quality=85)
-        return buf.getvalue()
+        return buf.getvalue(), None
 
 def do_ocr(path: Path):
     try:
@@ -77,12 +89,61 @@ def get_exif_date(path: Path):
         pass
     return None
 
-def scan_and_index(root: Path, conn, model, rebuild=False, faiss_mgr=None, vision_adapter=None):
+def find_reusable(sources, ph, thumb, need_vision, embed_dim=384):
+    """
+    Closest already-indexed near-duplicate whose analysis can be copied, or None.
+    `sources` is a list of (cursor, BKTree, allowed file_ids or None), one per library,
+    the scanned library first. Candidates must be within REUSE_DISTANCE and pass
+    verify_near_duplicate() against `thumb`, since copying OCR text and a summary from
+    a different photo is worse than paying for the vision call.
+    Returns (file_id, ocr_text, memory_summary, tags, vision_json, vision_status, embedding).
+    """
+    if not ph:
+        return None
+    for cur, tree, allowed in sources:
+        if tree is None:
+            continue
+        for _, fid in tree.find(ph, REUSE_DISTANCE):
+            if allowed is not None and fid not in allowed:
+                continue
+            cur.execute("SELECT file_id, ocr_text, memory_summary, tags, vision_json, vision_status, embedding, thumbnail FROM memories WHERE file_id=?", (fid,))
+            row = cur.fetchone()
+            if not row or decode_vector(row[6], embed_dim) is None:
+                continue
+            if need_vision and row[5] != "success":
+                continue
+            if not verify_near_duplicate(thumb, row[7]):
+                continue
+            return row[:7]
+    return None
+
+def scan_and_index(root: Path, conn, model, rebuild=False, faiss_mgr=None, vision_adapter=None, phash_index=None, embed_dim=384, donors=None, lock=None):
     """
     Walk root for supported image files. Insert new entries into DB.
+    Near-duplicates (by perceptual hash) of already-indexed images reuse their vision/OCR/embedding.
+    `donors` is a list of (db_path, BKTree) of other libraries embedded with the same model,
+    searched after this one; they are opened read-only for the duration of the scan.
+    `lock` is taken around each file's write, FAISS and BK-tree update.
     Returns (added, skipped)
     """
     cur = conn.cursor()
+    write_lock = lock or nullcontext()
+    vector_format = get_setting(conn, "vector_format", DEFAULT_VECTOR_FORMAT)
+    if phash_index is None:
+        backfill_phashes(conn)
+        phash_index = BKTree.from_db(conn)
+    # On rebuild only trust results produced during this run, not the stale ones being replaced
+    reuse_allowed = set() if rebuild else None
+    sources = [(cur, phash_index, reuse_allowed)]
+    donor_conns = []
+    for db_path, tree in donors or []:
+        try:
+            dc = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        except sqlite3.Error as e:
+            print(f"Not reusing results from {db_path}: {e}")
+            continue
+        donor_conns.append(dc)
+        sources.append((dc.cursor(), tree, None))
     files = []
     for dp, _, fns in os.walk(root):
         for fn in fns:
@@ -111,11 +172,14 @@ def scan_and_index(root: Path, conn, model, rebuild=False, faiss_mgr=None, visio
              # If `scan` endpoint is synchronous, we are fine.
              return None
 
-    for p in tqdm(files, desc="scan"):
+    for i, p in enumerate(tqdm(files, desc="scan")):
+        SCAN_QUEUE_DEPTH.set(len(files) - i)
         try:
-            h = file_hash(p)
+            with span("scan", "hash"):
+                h = file_hash(p)
         except Exception:
             skipped += 1
+            SCAN_FILES.inc(outcome="unreadable")
             continue
 
         # Check existing
@@ -133,6 +197,7 @@ def scan_and_index(root: Path, conn, model, rebuild=False, faiss_mgr=None, visio
             # Maybe check if we should retry vision?
             # For now stick to simple "skip if exists" unless rebuild
             skipped += 1
+            SCAN_FILES.inc(outcome="skipped")
             continue
 
         fid = str(uuid.uuid4())
@@ -143,19 +208,31 @@ def scan_and_index(root: Path, conn, model, rebuild=False, faiss_mgr=None, visio
         # 1. Basic Metadata
         created = datetime_iso(p)
         modified = datetime_iso(p)
-        exif_date = get_exif_date(p) or created
+        with span("scan", "exif"):
+            exif_date = get_exif_date(p) or created
+        caption = p.stem
+        with span("scan", "thumbnail"):
+            thumb, ph = make_thumbnail_and_phash(p)
+
+        # 2. Near-duplicate reuse: skip vision, OCR and embedding entirely
+        dup = find_reusable(sources, ph, thumb, need_vision=vision_adapter is not None, embed_dim=embed_dim)
+        dup_of = None
 
-        # 2. Vision Analysis
+        # 3. Vision Analysis
         vision_res = None
         vision_status = "pending"
         vision_json_str = None
 
-        if vision_adapter:
+        if dup:
+            dup_of, ocr, summary, tags, vision_json_str, vision_status, emb_blob = dup
+            emb = decode_vector(emb_blob, embed_dim)
+        elif vision_adapter:
             # We need to run async in this sync loop.
             # If `scan` is a sync function in FastAPI, it runs in a threadpool.
             # So `asyncio.run` creates a new loop for each call which is inefficient but works.
             try:
-                vision_res = asyncio.run(vision_adapter.analyze_image(str(p)))
+                with span("scan", "vision"):
+                    vision_res = asyncio.run(vision_adapter.analyze_image(str(p)))
                 if vision_res:
                     vision_status = "success"
                     # Pydantic v2 use model_dump_json()
@@ -166,42 +243,54 @@ def scan_and_index(root: Path, conn, model, rebuild=False, faiss_mgr=None, visio
                 print(f"Vision crash: {e}")
                 vision_status = "failed"
 
-        # 3. Text Extraction (Fallback or augment)
-        ocr = do_ocr(p)
-        caption = p.stem
+        if not dup:
+            # 4. Text Extraction (Fallback or augment)
+            with span("scan", "ocr"):
+                ocr = do_ocr(p)
 
-        # 4. Derive Summary & Tags
-        if vision_res:
-            summary = vision_res.summary
-            tag_list = vision_res.objects[:5] + [vision_res.setting, vision_res.time_of_day]
-            tags = ", ".join([str(t) for t in tag_list if t])
-            # Embed based on vision
-            emb_text = f"{summary} {tags} {ocr}"
-        else:
-            # Fallback
-            summary = summarize_text(ocr, caption)
-            tags = "ocr-fallback"
-            emb_text = f"{caption} {summary} {ocr}"
-
-        # 5. Embed
-        try:
-            emb = model.encode(emb_text).astype("float32")
-        except Exception:
-            emb = np.zeros((384,), dtype="float32")
+            # 5. Derive Summary & Tags
+            if vision_res:
+                summary = vision_res.summary
+                tag_list = vision_res.objects[:5] + [vision_res.setting, vision_res.time_of_day]
+                tags = ", ".join([str(t) for t in tag_list if t])
+            else:
+                # Fallback
+                summary = summarize_text(ocr, caption)
+                tags = "ocr-fallback"
+            emb_text = embedding_text(caption, summary, tags, ocr, vision_status)
+
+            # 6. Embed
+            try:
+                with span("scan", "embed"):
+                    emb = model.encode(emb_text).astype("float32")
+            except Exception:
+                emb = np.zeros((embed_dim,), dtype="float32")
 
-        thumb = make_thumbnail_bytes(p)
+        # 7. Save. Held under the library lock (when given) so searches never see the DB and
+        # FAISS out of step, and this commit can't land inside an events rebuild transaction
+        with write_lock:
+            with span("scan", "db_write"):
+                cur.execute("""
+                INSERT OR REPLACE INTO memories
+                (file_id, path, hash, created_at, modified_at, exif_date, ocr_text, caption, memory_summary, tags, vision_json, vision_status, embedding, thumbnail, phash, dup_of)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (fid, str(p), h, created, modified, exif_date, ocr, caption, summary, tags, vision_json_str, vision_status, encode_vector(emb, vector_format), thumb, ph, dup_of))
+                # Vectors a re-embed job stored for the previous text are stale now
+                cur.execute("DELETE FROM embedding_versions WHERE file_id=?", (fid,))
+                conn.commit()
+            if ph:
+                # On rescan the file_id may already be in the tree; a duplicate entry is harmless
+                phash_index.add(ph, fid)
+                if reuse_allowed is not None:
+                    reuse_allowed.add(fid)
 
-        # 6. Save
-        cur.execute("""
-            INSERT OR REPLACE INTO memories
-            (file_id, path, hash, created_at, modified_at, exif_date, ocr_text, caption, memory_summary, tags, vision_json, vision_status, embedding, thumbnail)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (fid, str(p), h, created, modified, exif_date, ocr, caption, summary, tags, vision_json_str, vision_status, emb.tobytes(), thumb))
-        conn.commit()
+            # incrementally add to faiss if provided
+            if faiss_mgr:
+                faiss_mgr.add_vector(emb, (fid, str(p)))
         added += 1
+        SCAN_FILES.inc(outcome="near_duplicate" if dup else "indexed")
 
-        # incrementally add to faiss if provided
-        if faiss_mgr:
-            faiss_mgr.add_vector(emb, (fid, str(p)))
-
+    SCAN_QUEUE_DEPTH.set(0)
+    for dc in donor_conns:
+        dc.close()
     return added, skipped
@@ -0,0 +1,328 @@
+# app/library.py
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+from .db import init_db, get_setting, set_setting
+from .vectors import DEFAULT_VECTOR_FORMAT
+from .embedding import LEGACY_MODEL_NAME, LEGACY_EMBED_DIM
+from .phash import BKTree, backfill_phashes
+from .events import update_events
+
+DB_FILENAME = ".memory_index.db"
+# Libraries not touched for this long get their connection and FAISS index dropped.
+# They stay registered and are reloaded transparently on the next query.
+IDLE_UNLOAD_SECONDS = 15 * 60
+
+
+class Library:
+    """
+    One mounted drive/folder with its own .memory_index.db and FAISS index.
+    `open()` only connects to the DB, which is all browsing and lookups by file_id need;
+    `load()` also builds the FAISS index and perceptual-hash BK-tree for search and scan.
+    """
+
+    def __init__(self, path, dim, model_name=LEGACY_MODEL_NAME):
+        self.path = str(path)
+        self.db_path = str(Path(path).joinpath(DB_FILENAME))
+        # Process (query) model; embed_model/dim are what this library's vectors were built with
+        self.model_name = model_name
+        self.embed_model = None
+        self.dim = dim
+        self.conn = None
+        self.faiss = None
+        self.phashes = None
+        self.last_used = 0.0
+        self.lock = threading.RLock()
+        # Long-running users (scans) pin the library so it is never unloaded under them
+        self.users = 0
+        self.detached = False
+        # Guards events_thread only, so checking on the refresh never waits for lock
+        self.events_lock = threading.Lock()
+        self.events_thread = None
+
+    @property
+    def opened(self):
+        return self.conn is not None
+
+    @property
+    def loaded(self):
+        return self.faiss is not None
+
+    def touch(self):
+        self.last_used = time.time()
+
+    def open(self):
+        with self.lock:
+            if self.conn is None:
+                self.conn = init_db(self.db_path)
+                self._load_model_settings()
+            self.touch()
+            return self
+
+    def load(self):
+        with self.lock:
+            self.open()
+            if self.faiss is None:
+                # Deferred so importing the app doesn't pay for faiss until a drive is searched
+                from .faiss_mgr import FaissManager
+                self.faiss = FaissManager(self.dim, self.vector_format())
+                self.faiss.build_from_db(self.conn)
+                backfill_phashes(self.conn)
+                self.phashes = BKTree.from_db(self.conn)
+            return self
+
+    @contextmanager
+    def in_use(self, load=True):
+        """Keep the library loaded (or just open, with load=False) for the duration of the block, e.g. a scan."""
+        with self.lock:
+            self.users += 1
+            try:
+                self.load() if load else self.open()
+            except Exception:
+                self.users -= 1
+                raise
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.users -= 1
+                self.touch()
+                if self.users == 0 and self.detached:
+                    self.unload()
+
+    def events_stale(self):
+        """Whether some dated memories are not assigned to an event yet (new scans, older DBs)."""
+        cur = self.open().conn.cursor()
+        cur.execute("SELECT 1 FROM memories WHERE event_id IS NULL AND exif_date IS NOT NULL LIMIT 1")
+        return cur.fetchone() is not None
+
+    def update_events(self, full=False):
+        """
+        Re-cluster events. The clustering pass reads on a separate read-only connection, so
+        only the final write holds self.lock and searches keep running meanwhile.
+        """
+        conn = self.open().conn
+        read = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            return update_events(conn, self.dim, full=full, lock=self.lock, read_conn=read)
+        finally:
+            read.close()
+
+    def refresh_events_in_background(self):
+        """
+        Cluster unassigned memories into events on a worker thread, so read endpoints never
+        write or do a full clustering pass themselves. Returns True while one is running.
+        """
+        with self.events_lock:
+            if self.events_thread is not None and self.events_thread.is_alive():
+                return True
+            if not self.events_stale():
+                return False
+            self.events_thread = threading.Thread(target=self._refresh_events, name="events-refresh", daemon=True)
+            self.events_thread.start()
+            return True
+
+    def _refresh_events(self):
+        try:
+            with self.in_use(load=False):
+                clustered = self.update_events()
+            print(f"Clustered {clustered} memories into events for {self.path}")
+        except Exception as e:
+            print(f"Event clustering failed for {self.path}: {e}")
+
+    def unload_if_idle(self, idle_seconds, now=None):
+        with self.lock:
+            now = now or time.time()
+            if self.conn is None or self.users or now - self.last_used <= idle_seconds:
+                return False
+            self.unload()
+            return True
+
+    def detach(self):
+        """Unload now, or once the last user is done if the library is pinned."""
+        with self.lock:
+            if self.users:
+                self.detached = True
+            else:
+                self.unload()
+
+    def unload(self):
+        with self.lock:
+            if self.conn is not None:
+                try:
+                    self.conn.close()
+                except Exception:
+                    pass
+            self.conn = None
+            self.faiss = None
+            self.phashes = None
+
+    def _load_model_settings(self):
+        self.embed_model = get_setting(self.conn, "embed_model")
+        if self.embed_model is None:
+            cur = self.conn.cursor()
+            cur.execute("SELECT 1 FROM memories WHERE embedding IS NOT NULL LIMIT 1")
+            if cur.fetchone():
+                # Built before the model was recorded
+                self.embed_model, self.dim = LEGACY_MODEL_NAME, LEGACY_EMBED_DIM
+                set_setting(self.conn, "embed_model", self.embed_model)
+                set_setting(self.conn, "embed_dim", str(self.dim))
+            else:
+                # No vectors yet: recorded by adopt_model() on the first scan, when the
+                # model's real output size is known
+                self.embed_model = self.model_name
+                return
+        self.dim = int(get_setting(self.conn, "embed_dim", self.dim))
+
+    def adopt_model(self, dim):
+        """
+        Record the process model and its output size `dim` for a library with no model
+        recorded yet, or correct a wrongly recorded size for the same model. Libraries
+        built with a different model are left alone (they need a re-embed).
+        """
+        with self.lock:
+            self.open()
+            recorded = get_setting(self.conn, "embed_model")
+            if recorded not in (None, self.model_name):
+                return False
+            if recorded is not None and get_setting(self.conn, "embed_dim") == str(dim):
+                return False
+            set_setting(self.conn, "embed_model", self.model_name)
+            set_setting(self.conn, "embed_dim", str(dim))
+            self.embed_model, self.dim = self.model_name, dim
+            if self.faiss is not None:
+                from .faiss_mgr import FaissManager
+                # Vectors skipped under the old size are picked up again
+                self.faiss = FaissManager(dim, self.vector_format())
+                self.faiss.build_from_db(self.conn)
+            return True
+
+    @property
+    def compatible(self):
+        """Whether stored vectors live in the same space as the process embedding model."""
+        return self.embed_model == self.model_name
+
+    def vector_format(self):
+        return get_setting(self.conn, "vector_format", DEFAULT_VECTOR_FORMAT)
+
+    def count(self):
+        self.open()
+        cur = self.conn.cursor()
+        cur.execute("SELECT COUNT(1) FROM memories")
+        return cur.fetchone()[0]
+
+    def search(self, qvec, topk=10):
+        with self.lock:
+            self.load()
+            if not self.compatible:
+                print(f"Skipping {self.path}: embedded with {self.embed_model}, querying with {self.model_name}. Re-embed it.")
+                return []
+            results = self.faiss.search(qvec, topk=topk)
+        for r in results:
+            r["library"] = self.path
+        return results
+
+    def info(self):
+        return {
+            "path": self.path,
+            "db_path": self.db_path,
+            "opened": self.opened,
+            "loaded": self.loaded,
+            "in_use": self.users,
+            "vectors": self.faiss.ntotal if self.faiss else None,
+            "vector_format": self.faiss.storage if self.faiss else None,
+            "embed_model": self.embed_model,
+            "compatible": self.compatible if self.opened else None,
+            "last_used": self.last_used,
+        }
+
+
+class LibraryRegistry:
+    """
+    Registry of every mounted library, keyed by absolute path.
+    `active` is the library used by endpoints that act on a single drive (scan, vision config).
+    """
+
+    def __init__(self, dim, model_name=LEGACY_MODEL_NAME, idle_seconds=IDLE_UNLOAD_SECONDS):
+        self.dim = dim
+        self.model_name = model_name
+        self.idle_seconds = idle_seconds
+        self.libraries = {}
+        self.active = None
+        self.lock = threading.Lock()
+
+    def _key(self, path):
+        return str(Path(path).resolve())
+
+    def register(self, path):
+        key = self._key(path)
+        with self.lock:
+            lib = self.libraries.get(key)
+            if lib is None:
+                lib = Library(key, self.dim, self.model_name)
+                self.libraries[key] = lib
+            return lib
+
+    def mount(self, path):
+        lib = self.register(path).load()
+        self.active = lib.path
+        return lib
+
+    def unmount(self, path):
+        key = self._key(path)
+        with self.lock:
+            lib = self.libraries.pop(key, None)
+        if lib is None:
+            return False
+        # A scan still running on it finishes first; its connection is closed afterwards
+        lib.detach()
+        if self.active == key:
+            self.active = next(iter(self.libraries), None)
+        return True
+
+    def get(self, path=None, load=True):
+        """
+        Return the library for `path`, or the active one. None if nothing matches.
+        With load=False only its DB connection is opened.
+        """
+        key = self._key(path) if path else self.active
+        if not key:
+            return None
+        lib = self.libraries.get(key)
+        if lib is None:
+            return None
+        return lib.load() if load else lib.open()
+
+    def all(self):
+        return list(self.libraries.values())
+
+    def select(self, paths=None):
+        """Mounted libraries matching `paths` (unknown paths are ignored), or all of them."""
+        if not paths:
+            return self.all()
+        keys = {self._key(p) for p in paths}
+        return [lib for lib in self.all() if lib.path in keys]
+
+    def find_memory(self, file_id):
+        """Locate the library holding `file_id`, checking already-open libraries first. Opens DBs only."""
+        libs = sorted(self.all(), key=lambda l: not l.opened)
+        for lib in libs:
+            lib.open()
+            cur = lib.conn.cursor()
+            cur.execute("SELECT 1 FROM memories WHERE file_id=?", (file_id,))
+            if cur.fetchone():
+                return lib
+        return None
+
+    def unload_idle(self):
+        now = time.time()
+        unloaded = []
+        for lib in self.all():
+            if lib.path != self.active and lib.unload_if_idle(self.idle_seconds, now):
+                unloaded.append(lib.path)
+        if unloaded:
+            print(f"Unloaded idle libraries: {unloaded}")
+        return unloaded
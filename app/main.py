@@ -1,48 +1,73 @@
 # app/main.py
 import os
-import io
-import hashlib
-import sqlite3
+import json
 import base64
+import time
+import asyncio
 from pathlib import Path
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from pydantic import BaseModel
-from fastapi.responses import Response, JSONResponse
-from sentence_transformers import SentenceTransformer
-from PIL import Image, ImageOps
-import numpy as np
-import faiss
-import pytesseract
-from datetime import datetime
-
-from .db import init_db, row_to_dict
-from .indexer import scan_and_index
-from .faiss_mgr import FaissManager
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel, Field
+from fastapi.responses import Response, JSONResponse, StreamingResponse, PlainTextResponse
+
+# Heavy imports (torch via sentence-transformers, faiss, pytesseract) are deferred:
+# the model loads on a background thread, faiss on first library load, the indexer on first scan.
+from .embedding import BackgroundModel, EMBED_BACKEND, MODEL_NAME, LEGACY_EMBED_DIM
+from .library import LibraryRegistry
+from .db import set_setting
+from .vectors import VECTOR_FORMATS, migrate_embeddings
+from .phash import duplicate_clusters, hamming, NEAR_DUP_DISTANCE
+from .paging import SearchCache, SEARCH_PREFETCH_PAGES, browse_page, encode_cursor, decode_cursor, cursor_after, cursor_offset, keyset_position, ndjson_lines
 from .vision.adapter import VisionAdapter
+from . import metrics
+from .metrics import span
+from .profiling import profile, ALLOW_REQUEST_PROFILING
 
 APP_DIR = Path(__file__).resolve().parent
 app = FastAPI(title="Memory Brain - Phase1.5")
 
-MODEL_NAME = "all-MiniLM-L6-v2"
-EMBED_DIM = 384
-
-# Global runtime state (simple single-drive focus)
+# Global runtime state. Each mounted drive is a Library with its own DB + FAISS index.
 state = {
-    "mounted_path": None,
-    "db_path": None,
-    "conn": None,
-    "faiss": None,
+    # The dim is only a placeholder for drives without vectors; their first scan records the model's real size
+    "libraries": LibraryRegistry(LEGACY_EMBED_DIM, MODEL_NAME),
+    "search_cache": SearchCache(),
+    "embedder": BackgroundModel(MODEL_NAME, EMBED_BACKEND),
     "embed_model": None
 }
 
-# Simple boot
+def active_library():
+    return state["libraries"].get()
+
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    t0 = time.perf_counter()
+    # Opt-in per-request profiling: RECALLBOX_ALLOW_PROFILE=1 and an `X-Profile: 1` header
+    if ALLOW_REQUEST_PROFILING and request.headers.get("x-profile"):
+        with profile(f"{request.method}-{request.url.path}", request.headers.get("x-profile-engine")) as prof:
+            response = await call_next(request)
+        response.headers["X-Profile-File"] = prof["path"]
+    else:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.HTTP_SECONDS.observe(time.perf_counter() - t0, method=request.method,
+                                 route=getattr(route, "path", "unmatched"), status=response.status_code)
+    return response
+
+# Start loading the embedding model without blocking the server; /readyz reports when it's done
 @app.on_event("startup")
 def load_model():
-    try:
-        state["embed_model"] = SentenceTransformer(MODEL_NAME)
-    except Exception as e:
-        raise RuntimeError(f"Failed loading embedding model: {e}")
+    state["embedder"].start()
+
+def get_embed_model(timeout=0.0):
+    """The loaded embedding model, waiting up to `timeout` seconds. 503 while still loading."""
+    if state["embed_model"] is None:
+        state["embed_model"] = state["embedder"].wait(timeout)
+    if state["embed_model"] is None:
+        info = state["embedder"].info()
+        if info["status"] == "failed":
+            raise HTTPException(status_code=503, detail=f"embedding model failed to load: {info['error']}")
+        raise HTTPException(status_code=503, detail="embedding model is still loading", headers={"Retry-After": "5"})
+    return state["embed_model"]
 
 class MountRequest(BaseModel):
     path: str
@@ -52,38 +77,64 @@ def mount(req: MountRequest):
     p = Path(req.path)
     if not p.exists() or not p.is_dir():
         raise HTTPException(status_code=400, detail="path does not exist or is not a directory")
-    db_path = p.joinpath(".memory_index.db")
-    conn = init_db(str(db_path))
-    state.update({
-        "mounted_path": str(p),
-        "db_path": str(db_path),
-        "conn": conn,
-        "faiss": FaissManager(EMBED_DIM)
-    })
-    # Build FAISS from existing DB
-    state["faiss"].build_from_db(conn)
-    # count entries
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(1) FROM memories")
-    count = cur.fetchone()[0]
-    return {"status": "ok", "db_path": str(db_path), "count": count}
+    registry = state["libraries"]
+    registry.unload_idle()
+    # Mounting adds to the registry and makes it the active library; other drives stay mounted.
+    lib = registry.mount(p)
+    return {"status": "ok", "db_path": lib.db_path, "count": lib.count(), "libraries": len(registry.libraries)}
+
+@app.post("/unmount")
+def unmount(req: MountRequest):
+    if not state["libraries"].unmount(req.path):
+        raise HTTPException(status_code=404, detail="library not mounted")
+    return {"status": "ok", "active": state["libraries"].active}
+
+@app.post("/libraries/reload")
+def reload_library(req: MountRequest):
+    # Pick up changes made outside the server, e.g. an offline re-embed swap
+    lib = state["libraries"].select([req.path])
+    if not lib:
+        raise HTTPException(status_code=404, detail="library not mounted")
+    lib[0].unload()
+    lib[0].load()
+    return {"status": "ok", "library": lib[0].info()}
+
+@app.get("/libraries")
+def libraries():
+    registry = state["libraries"]
+    return {"active": registry.active, "libraries": [lib.info() for lib in registry.all()]}
 
 class ScanRequest(BaseModel):
     path: Optional[str] = None
     rescan: Optional[bool] = False
+    # Capture a cProfile/pyinstrument report of this scan
+    profile: Optional[bool] = False
 
 @app.post("/scan")
 def scan(req: ScanRequest):
+    registry = state["libraries"]
     if req.path:
         base = Path(req.path)
+        if not base.exists():
+            raise HTTPException(status_code=400, detail="scan path does not exist")
+        lib = registry.register(base)
     else:
-        if not state["mounted_path"]:
+        lib = active_library()
+        if not lib:
             raise HTTPException(status_code=400, detail="No mounted path. Call /mount first or supply path.")
-        base = Path(state["mounted_path"])
-    if not base.exists():
-        raise HTTPException(status_code=400, detail="scan path does not exist")
-    conn = state["conn"] or init_db(str(base.joinpath(".memory_index.db")))
-    model = state["embed_model"]
+        base = Path(lib.path)
+    # Pinned for the whole scan: idle unloading and /unmount must not close the DB under it
+    with lib.in_use():
+        return _scan_library(registry, lib, base, req)
+
+def _scan_library(registry, lib, base, req):
+    if not lib.compatible:
+        raise HTTPException(status_code=409, detail=f"library was embedded with {lib.embed_model} but the server uses {MODEL_NAME}; run python -m app.reembed first")
+    # Scans are long-running anyway; let one issued during start-up wait for the model
+    model = get_embed_model(timeout=300)
+    lib.adopt_model(int(model.get_sentence_embedding_dimension()))
+    conn = lib.conn
+    from .indexer import scan_and_index
 
     # Load vision config if available
     vision_adapter = None
@@ -96,97 +147,295 @@ def scan(req: ScanRequest):
     except Exception as e:
         print(f"Failed to load vision config: {e}")
 
-    added, skipped = scan_and_index(base, conn, model, rebuild=req.rescan, faiss_mgr=state.get("faiss"), vision_adapter=vision_adapter)
-    # After scan, ensure FAISS rebuilt if needed
-    if state.get("faiss"):
-        state["faiss"].build_from_db(conn)
-    return {"status": "ok", "scanned_path": str(base), "new": added, "skipped": skipped}
+    # Other loaded libraries in the same embedding space can donate near-duplicate results
+    donors = [(other.db_path, other.phashes) for other in registry.all()
+              if other is not lib and other.loaded and other.compatible and other.dim == lib.dim]
+
+    prof = {}
+    if req.profile:
+        # cProfile only sees the calling thread, which is where the whole scan runs
+        with profile("scan", "cprofile") as prof:
+            added, skipped = scan_and_index(base, conn, model, rebuild=req.rescan, faiss_mgr=lib.faiss, vision_adapter=vision_adapter, phash_index=lib.phashes, embed_dim=lib.dim, donors=donors, lock=lib.lock)
+    else:
+        added, skipped = scan_and_index(base, conn, model, rebuild=req.rescan, faiss_mgr=lib.faiss, vision_adapter=vision_adapter, phash_index=lib.phashes, embed_dim=lib.dim, donors=donors, lock=lib.lock)
+    with lib.lock:
+        # After scan, ensure FAISS rebuilt if needed
+        lib.faiss.build_from_db(conn)
+    # Re-cluster only the stretch of time the new memories fall into
+    with span("scan", "events"):
+        clustered = lib.update_events()
+    out = {"status": "ok", "scanned_path": str(base), "new": added, "skipped": skipped, "events_updated": clustered}
+    if prof:
+        out["profile"] = prof
+    return out
 
 class SearchRequest(BaseModel):
-    query: str
-    top_k: Optional[int] = 12
+    query: Optional[str] = ""
+    # Page size. Pass `cursor` from a previous response to continue the same search.
+    top_k: int = Field(12, ge=1, le=500)
     date_from: Optional[str] = None
     date_to: Optional[str] = None
+    # Restrict the fan-out to these library paths; defaults to every mounted library
+    libraries: Optional[List[str]] = None
+    # Drop results that are near-duplicates (perceptual hash) of a better-scoring result
+    collapse_duplicates: Optional[bool] = False
+    cursor: Optional[str] = None
+    # Respond with NDJSON (one result per line, then {"next_cursor": ...}) instead of a JSON body
+    stream: Optional[bool] = False
+
+# Threshold filtering (L2 distance)
+# 1.2 is a loose threshold for "relevant enough"
+# 0.5 is very close. 1.5 is likely irrelevant.
+SCORE_THRESHOLD = 1.4
+
+async def _fetch_candidates(entry):
+    """(Re)run the fan-out for the cached query vector at entry["depth"] per library."""
+    libs = state["libraries"].select(entry["libraries"])
+    with span("search", "faiss"):
+        per_lib = await asyncio.gather(*[asyncio.to_thread(lib.search, entry["qvec"], entry["depth"]) for lib in libs])
+    entry["results"] = sorted((r for rs in per_lib for r in rs), key=lambda r: (r["score"], r["library"], r["file_id"]))
+    # A library returning fewer than `depth` hits has nothing more to give
+    entry["exhausted"] = all(len(rs) < entry["depth"] for rs in per_lib)
+    # A truncated library may hold more hits at or past its worst returned score (ties are
+    # common with the quantized indexes), so only results strictly better than the smallest
+    # such score are final and safe to hand out
+    bounds = [rs[-1]["score"] for rs in per_lib if len(rs) >= entry["depth"]]
+    if bounds:
+        bound = min(bounds)
+        entry["final"] = sum(1 for r in entry["results"] if r["score"] < bound)
+    else:
+        entry["final"] = len(entry["results"])
+
+def _in_date_range(exif_date, entry):
+    # Memories without a date are never filtered out
+    if not exif_date:
+        return True
+    if entry["date_from"] and exif_date < entry["date_from"]:
+        return False
+    if entry["date_to"] and exif_date > entry["date_to"]:
+        return False
+    return True
+
+def _dup_meta(entry, r):
+    """(exif_date, phash) of a result, remembered per search so cursors can replay collapsing."""
+    key = (r["library"], r["file_id"])
+    meta = entry["meta"].get(key)
+    if meta is None:
+        lib = state["libraries"].libraries.get(r["library"])
+        if not lib:
+            return None, None
+        c = lib.open().conn.cursor()
+        c.execute("SELECT exif_date, phash FROM memories WHERE file_id=?", (r["file_id"],))
+        meta = entry["meta"][key] = c.fetchone() or (None, None)
+    return meta
+
+def _kept_phashes(entry, offset):
+    """
+    Hashes of the results shown before `offset`. Recomputed from the ranked list rather than
+    accumulated, so replaying a cursor (retries, double fetches) returns the same page.
+    """
+    kept = []
+    for r in entry["results"][:offset]:
+        exif_date, phash = _dup_meta(entry, r)
+        if not _in_date_range(exif_date, entry) or not phash:
+            continue
+        if not any(hamming(phash, k) <= NEAR_DUP_DISTANCE for k in kept):
+            kept.append(phash)
+    return kept
+
+def _hydrate(r, entry, kept=None):
+    lib = state["libraries"].libraries.get(r["library"])
+    if not lib:
+        return None
+    c = lib.open().conn.cursor()
+    c.execute("SELECT file_id, path, created_at, exif_date, memory_summary, thumbnail, tags, vision_status, phash FROM memories WHERE file_id=?", (r["file_id"],))
+    row = c.fetchone()
+    if not row:
+        return None
+
+    # Manually unpack since we selected specific columns
+    file_id, path_val, created_at, exif_date, summary, thumbnail_blob, tags, vision_status, phash = row
+    entry["meta"][(r["library"], file_id)] = (exif_date, phash)
+
+    # date filtering
+    if not _in_date_range(exif_date, entry):
+        return None
+    if kept is not None and phash:
+        if any(hamming(phash, k) <= NEAR_DUP_DISTANCE for k in kept):
+            return None
+        kept.append(phash)
+    thumb_b64 = None
+    if thumbnail_blob:
+        thumb_b64 = "data:image/jpeg;base64," + base64.b64encode(thumbnail_blob).decode("utf-8")
+    return {
+        "file_id": file_id,
+        "path": path_val,
+        "score": float(r["score"]),
+        "summary": summary,
+        "tags": tags,
+        "vision_status": vision_status,
+        "exif_date": exif_date,
+        "thumbnail_b64": thumb_b64,
+        "library": r["library"]
+    }
+
+async def _iter_page(entry, pos, limit):
+    """Yield up to `limit` hydrated results starting at pos["offset"]; deepens the FAISS search when the cached list runs out."""
+    kept = _kept_phashes(entry, pos["offset"]) if entry["collapse_duplicates"] else None
+    emitted = 0
+    while emitted < limit:
+        if pos["offset"] >= entry["final"]:
+            if entry["exhausted"]:
+                break
+            entry["depth"] *= 2
+            await _fetch_candidates(entry)
+            continue
+        r = entry["results"][pos["offset"]]
+        if r["score"] > SCORE_THRESHOLD:
+            # Sorted by distance, so nothing after this passes either
+            entry["exhausted"] = True
+            pos["offset"] = len(entry["results"])
+            break
+        pos["offset"] += 1
+        item = _hydrate(r, entry, kept)
+        if item:
+            emitted += 1
+            yield item
+
+def _next_cursor(entry, sid, pos):
+    if entry["exhausted"] and pos["offset"] >= entry["final"]:
+        return None
+    return encode_cursor({"sid": sid, "offset": pos["offset"]})
 
 @app.post("/search")
 async def search(req: SearchRequest):
-    if not state.get("faiss") or state["faiss"].index.ntotal == 0:
-        # try to build from DB
-        if state.get("conn"):
-            state["faiss"].build_from_db(state["conn"])
-        else:
+    registry = state["libraries"]
+    registry.unload_idle()
+    cache = state["search_cache"]
+
+    if req.cursor:
+        cur = decode_cursor(req.cursor)
+        offset = cursor_offset(cur)
+        if offset is None or not isinstance(cur.get("sid"), str):
+            raise HTTPException(status_code=400, detail="invalid cursor")
+        entry = cache.get(cur["sid"])
+        if entry is None:
+            raise HTTPException(status_code=410, detail="search cursor expired; run the search again")
+        sid, pos = cur["sid"], {"offset": offset}
+    else:
+        if not req.query:
+            raise HTTPException(status_code=400, detail="query or cursor required")
+        libs = registry.select(req.libraries)
+        if not libs:
             raise HTTPException(status_code=400, detail="no index available; mount and scan first")
 
-    # Query rewriting
-    search_query = req.query
-    conn = state.get("conn")
-    if conn:
-        try:
-            c = conn.cursor()
-            c.execute("SELECT endpoint_url, model_name, api_key FROM vision_config WHERE id=1")
-            row = c.fetchone()
-            if row:
-                adapter = VisionAdapter(row[0], row[1], row[2])
-                expanded = await adapter.expand_query(req.query)
-                if expanded and len(expanded) > 5:
-                    print(f"Rewrote query '{req.query}' -> '{expanded}'")
-                    search_query = expanded
-        except Exception as e:
-            print(f"Query expansion failed: {e}")
-
-    qvec = state["embed_model"].encode(search_query).astype("float32")
-    results = state["faiss"].search(qvec, topk=req.top_k)
-    # optionally filter by date range
-    out = []
-
-    c = conn.cursor()
-    for r in results:
-        fid, path, score = r["file_id"], r["path"], r["score"]
-        # Threshold filtering (L2 distance)
-        # 1.2 is a loose threshold for "relevant enough"
-        # 0.5 is very close. 1.5 is likely irrelevant.
-        if score > 1.4:
-            continue
-
-        c.execute("SELECT file_id, path, created_at, exif_date, memory_summary, thumbnail, tags, vision_status FROM memories WHERE file_id=?", (fid,))
-        row = c.fetchone()
-        if not row:
-            continue
-
-        # Manually unpack since we selected specific columns
-        file_id, path_val, created_at, exif_date, summary, thumbnail_blob, tags, vision_status = row
-
-        # date filtering
-        if req.date_from or req.date_to:
-            ok = True
-            if req.date_from:
-                if exif_date:
-                    ok = ok and exif_date >= req.date_from
-            if req.date_to:
-                if exif_date:
-                    ok = ok and exif_date <= req.date_to
-            if not ok:
-                continue
-        thumb_b64 = None
-        if thumbnail_blob:
-            thumb_b64 = "data:image/jpeg;base64," + base64.b64encode(thumbnail_blob).decode("utf-8")
-        out.append({
-            "file_id": file_id,
-            "path": path_val,
-            "score": float(score),
-            "summary": summary,
-            "tags": tags,
-            "vision_status": vision_status,
-            "exif_date": exif_date,
-            "thumbnail_b64": thumb_b64
-        })
-    return {"results": out}
+        # Query rewriting (uses the active library's vision config)
+        search_query = req.query
+        active = active_library()
+        conn = active.conn if active else None
+        if conn:
+            try:
+                c = conn.cursor()
+                c.execute("SELECT endpoint_url, model_name, api_key FROM vision_config WHERE id=1")
+                row = c.fetchone()
+                if row:
+                    adapter = VisionAdapter(row[0], row[1], row[2])
+                    with span("search", "expand"):
+                        expanded = await adapter.expand_query(req.query)
+                    if expanded and len(expanded) > 5:
+                        print(f"Rewrote query '{req.query}' -> '{expanded}'")
+                        search_query = expanded
+            except Exception as e:
+                print(f"Query expansion failed: {e}")
+
+        with span("search", "encode"):
+            qvec = get_embed_model().encode(search_query).astype("float32")
+        # Cache the query vector and ranked candidates so cursors page without re-encoding
+        entry = {
+            "qvec": qvec,
+            "libraries": [lib.path for lib in libs],
+            "depth": req.top_k * SEARCH_PREFETCH_PAGES,
+            "date_from": req.date_from,
+            "date_to": req.date_to,
+            "collapse_duplicates": req.collapse_duplicates,
+            # (library, file_id) -> (exif_date, phash) of results hydrated so far
+            "meta": {},
+        }
+        # Fan out: each library searches its own index in a worker thread, then merge globally
+        await _fetch_candidates(entry)
+        sid, pos = cache.put(entry), {"offset": 0}
+
+    if req.stream:
+        async def gen():
+            async for item in _iter_page(entry, pos, req.top_k):
+                yield json.dumps(item) + "\n"
+            yield json.dumps({"next_cursor": _next_cursor(entry, sid, pos)}) + "\n"
+        return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+    with span("search", "hydrate"):
+        out = [item async for item in _iter_page(entry, pos, req.top_k)]
+    with span("search", "serialize"):
+        return JSONResponse({"results": out, "next_cursor": _next_cursor(entry, sid, pos)})
+
+@app.get("/memories")
+def list_memories(limit: int = 50, cursor: Optional[str] = None, order: str = "desc",
+                  library: Optional[str] = None, date_from: Optional[str] = None,
+                  date_to: Optional[str] = None, stream: bool = False):
+    """Browse the library by exif_date using keyset pagination (merged across mounted libraries)."""
+    registry = state["libraries"]
+    libs = registry.select([library] if library else None)
+    if not libs:
+        raise HTTPException(status_code=400, detail="No DB loaded")
+    limit = max(1, min(limit, 500))
+    descending = order != "asc"
+    after = None
+    if cursor:
+        after = cursor_after(decode_cursor(cursor))
+        if after is None:
+            raise HTTPException(status_code=400, detail="invalid cursor")
+
+    rows = []
+    for lib in libs:
+        # Browsing is plain SQL; no need to build FAISS / BK-trees for it
+        lib.open()
+        for row in browse_page(lib.conn, limit, after, descending, date_from, date_to):
+            rows.append((row, lib.path))
+    # Each library page is already ordered; merge and keep the global first `limit`
+    rows.sort(key=lambda x: (x[0][3], x[0][0]), reverse=descending)
+    rows = rows[:limit]
+
+    items = [{
+        "file_id": row[0],
+        "path": row[1],
+        "created_at": row[2],
+        "exif_date": row[3],
+        "summary": row[4],
+        "tags": row[5],
+        "vision_status": row[6],
+        "library": lib_path
+    } for row, lib_path in rows]
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1][0]
+        next_cursor = encode_cursor({"after": [last[3], last[0]]})
+
+    if stream:
+        return StreamingResponse(ndjson_lines(items, {"next_cursor": next_cursor}), media_type="application/x-ndjson")
+    return {"memories": items, "next_cursor": next_cursor}
+
+def library_for(file_id: str, library: Optional[str] = None):
+    registry = state["libraries"]
+    if not registry.libraries:
+        raise HTTPException(status_code=400, detail="No DB loaded")
+    lib = registry.get(library, load=False) if library else registry.find_memory(file_id)
+    if not lib:
+        raise HTTPException(status_code=404, detail="memory not found")
+    lib.touch()
+    return lib
 
 @app.get("/thumbnail/{file_id}")
-def thumbnail(file_id: str):
-    if not state.get("conn"):
-        raise HTTPException(status_code=400, detail="No DB loaded")
-    c = state["conn"].cursor()
+def thumbnail(file_id: str, library: Optional[str] = None):
+    c = library_for(file_id, library).conn.cursor()
     c.execute("SELECT thumbnail FROM memories WHERE file_id=?", (file_id,))
     row = c.fetchone()
     if not row or not row[0]:
@@ -194,10 +443,9 @@ def thumbnail(file_id: str):
     return Response(content=row[0], media_type="image/jpeg")
 
 @app.get("/memory/{file_id}")
-def memory(file_id: str):
-    if not state.get("conn"):
-        raise HTTPException(status_code=400, detail="No DB loaded")
-    c = state["conn"].cursor()
+def memory(file_id: str, library: Optional[str] = None):
+    lib = library_for(file_id, library)
+    c = lib.conn.cursor()
     c.execute("SELECT file_id, path, hash, created_at, modified_at, exif_date, ocr_text, caption, memory_summary, tags, vision_json, vision_status FROM memories WHERE file_id=?", (file_id,))
     row = c.fetchone()
     if not row:
@@ -214,13 +462,217 @@ def memory(file_id: str):
         "memory_summary": row[8],
         "tags": row[9],
         "vision_json": row[10],
-        "vision_status": row[11]
+        "vision_status": row[11],
+        "library": lib.path
     }
     return rec
 
+def _thumb_b64(blob):
+    if not blob:
+        return None
+    return "data:image/jpeg;base64," + base64.b64encode(blob).decode("utf-8")
+
+def events_libraries(library: Optional[str] = None):
+    """
+    Libraries whose events to serve: `library`, or every mounted one. Only their DBs are opened.
+    Memories not yet clustered (older DBs, scans from before events existed) are handled on a
+    background thread; returns (libraries, paths still being clustered).
+    """
+    libs = state["libraries"].select([library] if library else None)
+    if not libs:
+        raise HTTPException(status_code=400, detail="No DB loaded")
+    pending = []
+    for lib in libs:
+        lib.open()
+        if lib.refresh_events_in_background():
+            pending.append(lib.path)
+    return libs, pending
+
+@app.get("/events")
+def list_events(library: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None,
+                order: str = "desc", date_from: Optional[str] = None, date_to: Optional[str] = None):
+    """
+    Precomputed event summaries with a representative thumbnail, keyset-paginated by start_date
+    and merged across mounted libraries. Event ids are per library, so the cursor keeps one
+    position per library.
+    """
+    libs, pending = events_libraries(library)
+    limit = max(1, min(limit, 200))
+    descending = order != "asc"
+    op, direction = ("<", "DESC") if descending else (">", "ASC")
+    afters = {}
+    if cursor:
+        cur = decode_cursor(cursor)
+        positions = cur.get("after") if cur else None
+        if not isinstance(positions, dict):
+            raise HTTPException(status_code=400, detail="invalid cursor")
+        for path, pos in positions.items():
+            after = keyset_position(pos)
+            if after is None:
+                raise HTTPException(status_code=400, detail="invalid cursor")
+            afters[path] = after
+
+    rows = []
+    more = False
+    for lib in libs:
+        where, params = ["1=1"], []
+        if lib.path in afters:
+            where.append(f"(e.start_date, e.event_id) {op} (?, ?)")
+            params.extend(afters[lib.path])
+        if date_from:
+            where.append("e.end_date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("e.start_date <= ?")
+            params.append(date_to)
+        c = lib.conn.cursor()
+        c.execute(f"""
+            SELECT e.event_id, e.start_date, e.end_date, e.size, e.representative_id, e.summary, e.tags, m.thumbnail
+            FROM events e LEFT JOIN memories m ON m.file_id = e.representative_id
+            WHERE {' AND '.join(where)}
+            ORDER BY e.start_date {direction}, e.event_id {direction} LIMIT ?
+        """, (*params, limit))
+        lib_rows = c.fetchall()
+        more = more or len(lib_rows) == limit
+        rows.extend((r, lib.path) for r in lib_rows)
+    # Each library page is already ordered; merge and keep the global first `limit`
+    rows.sort(key=lambda x: (x[0][1], x[1], x[0][0]), reverse=descending)
+    more = more or len(rows) > limit
+    rows = rows[:limit]
+
+    events = [{
+        "event_id": r[0],
+        "start_date": r[1],
+        "end_date": r[2],
+        "size": r[3],
+        "representative_id": r[4],
+        "summary": r[5],
+        "tags": r[6],
+        "thumbnail_b64": _thumb_b64(r[7]),
+        "library": lib_path
+    } for r, lib_path in rows]
+    next_cursor = None
+    if more and rows:
+        # Libraries with nothing on this page keep their previous position
+        for r, lib_path in rows:
+            afters[lib_path] = [r[1], r[0]]
+        next_cursor = encode_cursor({"after": afters})
+    return {"events": events, "next_cursor": next_cursor, "clustering": pending}
+
+@app.get("/events/{event_id}/memories")
+def event_memories(event_id: int, library: Optional[str] = None, limit: int = 200, offset: int = 0):
+    # Event ids are per library; pass the `library` of the event (defaults to the active one)
+    lib = state["libraries"].get(library, load=False)
+    if not lib:
+        raise HTTPException(status_code=400, detail="No DB loaded")
+    lib.touch()
+    c = lib.conn.cursor()
+    c.execute("""SELECT file_id, path, created_at, exif_date, memory_summary, tags, vision_status
+                 FROM memories WHERE event_id=? ORDER BY exif_date, file_id LIMIT ? OFFSET ?""",
+              (event_id, max(1, min(limit, 1000)), max(0, offset)))
+    return {"event_id": event_id, "library": lib.path, "memories": [{
+        "file_id": r[0],
+        "path": r[1],
+        "created_at": r[2],
+        "exif_date": r[3],
+        "summary": r[4],
+        "tags": r[5],
+        "vision_status": r[6],
+        "library": lib.path
+    } for r in c.fetchall()]}
+
+@app.get("/timeline")
+def timeline(library: Optional[str] = None, granularity: str = "month"):
+    """Per-year or per-month totals aggregated from the events tables of the mounted libraries, for the Timeline/Chronicle headers."""
+    libs, pending = events_libraries(library)
+    width = 4 if granularity == "year" else 7
+    buckets = {}
+    for lib in libs:
+        c = lib.conn.cursor()
+        c.execute(f"""
+            SELECT substr(start_date, 1, {width}) AS bucket, COUNT(1), SUM(size), MIN(start_date), MAX(end_date)
+            FROM events GROUP BY bucket
+        """)
+        for period, events, memories, start, end in c.fetchall():
+            b = buckets.get(period)
+            if b is None:
+                buckets[period] = {"period": period, "events": events, "memories": memories,
+                                   "start_date": start, "end_date": end}
+            else:
+                b["events"] += events
+                b["memories"] += memories
+                b["start_date"] = min(b["start_date"], start)
+                b["end_date"] = max(b["end_date"], end)
+    return {"libraries": [lib.path for lib in libs], "granularity": "year" if width == 4 else "month",
+            "buckets": sorted(buckets.values(), key=lambda b: b["period"], reverse=True),
+            "clustering": pending}
+
+@app.post("/events/rebuild")
+def rebuild_events(library: Optional[str] = None):
+    lib = state["libraries"].get(library, load=False)
+    if not lib:
+        raise HTTPException(status_code=400, detail="No DB loaded")
+    clustered = lib.update_events(full=True)
+    c = lib.conn.cursor()
+    c.execute("SELECT COUNT(1) FROM events")
+    return {"status": "ok", "memories": clustered, "events": c.fetchone()[0]}
+
+@app.get("/duplicates")
+def duplicates(library: Optional[str] = None, max_distance: int = NEAR_DUP_DISTANCE):
+    lib = state["libraries"].get(library)
+    if not lib:
+        raise HTTPException(status_code=400, detail="No DB loaded")
+    lib.touch()
+    clusters = duplicate_clusters(lib.conn, max_distance)
+    c = lib.conn.cursor()
+    out = []
+    for fids in clusters:
+        members = []
+        for fid in fids:
+            c.execute("SELECT file_id, path, exif_date, memory_summary, dup_of FROM memories WHERE file_id=?", (fid,))
+            row = c.fetchone()
+            if row:
+                members.append({"file_id": row[0], "path": row[1], "exif_date": row[2], "summary": row[3], "dup_of": row[4]})
+        out.append({"size": len(members), "members": members})
+    out.sort(key=lambda g: g["size"], reverse=True)
+    return {"library": lib.path, "clusters": out}
+
+@app.get("/metrics")
+def metrics_endpoint():
+    # Point-in-time gauges are refreshed on scrape
+    registry = state["libraries"]
+    metrics.FAISS_NTOTAL.clear()
+    metrics.DB_SIZE_BYTES.clear()
+    loaded = 0
+    for lib in registry.all():
+        if lib.loaded:
+            loaded += 1
+            metrics.FAISS_NTOTAL.set(lib.faiss.ntotal, library=lib.path)
+        try:
+            metrics.DB_SIZE_BYTES.set(os.path.getsize(lib.db_path), library=lib.path)
+        except OSError:
+            pass
+    metrics.LIBRARIES.set(loaded, state="loaded")
+    metrics.LIBRARIES.set(len(registry.libraries) - loaded, state="unloaded")
+    metrics.SEARCH_CACHE_ENTRIES.set(len(state["search_cache"].entries))
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/livez")
+def livez():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    info = state["embedder"].info()
+    if state["embed_model"] is None and info["status"] != "ready":
+        return JSONResponse(status_code=503, content=info)
+    return info
+
 @app.get("/health")
 def health():
-    return {"status": "ok", "mounted_path": state.get("mounted_path")}
+    registry = state["libraries"]
+    return {"status": "ok", "mounted_path": registry.active, "libraries": len(registry.libraries),
+            "model": state["embedder"].status}
 
 # --- Config Endpoints ---
 
@@ -231,12 +683,13 @@ class VisionConfig(BaseModel):
 
 @app.get("/config/vision")
 def get_vision_config():
-    if not state.get("conn"):
+    lib = active_library()
+    if not lib:
          # Allow getting empty config if not mounted, or raise?
          # User might want to config before mount? No, DB is in mounted path.
          raise HTTPException(status_code=400, detail="Mount drive first to configure vision")
 
-    c = state["conn"].cursor()
+    c = lib.conn.cursor()
     c.execute("SELECT endpoint_url, model_name, api_key FROM vision_config WHERE id=1")
     row = c.fetchone()
     if row:
@@ -245,16 +698,53 @@ def get_vision_config():
 
 @app.post("/config/vision")
 def set_vision_config(cfg: VisionConfig):
-    if not state.get("conn"):
+    lib = active_library()
+    if not lib:
         raise HTTPException(status_code=400, detail="Mount drive first")
 
-    c = state["conn"].cursor()
+    c = lib.conn.cursor()
     # upsert
     c.execute("INSERT OR REPLACE INTO vision_config (id, endpoint_url, model_name, api_key) VALUES (1, ?, ?, ?)",
               (cfg.endpoint_url, cfg.model_name, cfg.api_key))
-    state["conn"].commit()
+    lib.conn.commit()
     return {"status": "saved"}
 
+class StorageConfig(BaseModel):
+    # float32 | float16 | int8
+    vector_format: str
+    # Re-encode existing embeddings in place (otherwise only new vectors use the format)
+    migrate: Optional[bool] = True
+    # Reclaim the freed space on disk afterwards; rewrites the whole DB file
+    vacuum: Optional[bool] = False
+
+@app.get("/config/storage")
+def get_storage_config():
+    lib = active_library()
+    if not lib:
+        raise HTTPException(status_code=400, detail="Mount drive first")
+    return {"vector_format": lib.vector_format(), "formats": list(VECTOR_FORMATS)}
+
+@app.post("/config/storage")
+def set_storage_config(cfg: StorageConfig):
+    lib = active_library()
+    if not lib:
+        raise HTTPException(status_code=400, detail="Mount drive first")
+    if cfg.vector_format not in VECTOR_FORMATS:
+        raise HTTPException(status_code=400, detail=f"vector_format must be one of {list(VECTOR_FORMATS)}")
+
+    from .faiss_mgr import FaissManager
+    with lib.lock:
+        set_setting(lib.conn, "vector_format", cfg.vector_format)
+        rewritten = migrate_embeddings(lib.conn, cfg.vector_format, lib.dim) if cfg.migrate else 0
+        if cfg.vacuum:
+            lib.conn.execute("VACUUM")
+        # Swap in an index of the new kind, built from the (re-encoded) DB
+        fm = FaissManager(lib.dim, cfg.vector_format)
+        fm.build_from_db(lib.conn)
+        lib.faiss = fm
+    return {"status": "saved", "vector_format": cfg.vector_format, "migrated": rewritten,
+            "vectors": fm.ntotal}
+
 @app.post("/config/vision/test")
 async def test_vision_config(cfg: VisionConfig):
     # Try to reach the endpoint with a simple chat message
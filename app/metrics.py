@@ -0,0 +1,147 @@
+# app/metrics.py
+"""
+Tiny in-process metrics registry rendered in the Prometheus text format.
+Kept dependency-free on purpose; names follow Prometheus conventions so a real
+scraper can consume /metrics directly.
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Seconds. Covers sub-ms FAISS lookups up to multi-second vision calls.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Emit one JSON line per span to stdout when set
+TRACE = os.environ.get("RECALLBOX_TRACE") == "1"
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(l, "")) for l in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, v in items:
+            lines.extend(self._render_one(key, v))
+        return lines
+
+    def _render_one(self, key, v):
+        return [f"{self.name}{_fmt_labels(self.labels, key)} {v}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def clear(self):
+        with self.lock:
+            self.values = {}
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            h = self.values.get(key)
+            if h is None:
+                h = self.values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    h["counts"][i] += 1
+            h["sum"] += value
+            h["count"] += 1
+
+    def _render_one(self, key, h):
+        lines = []
+        for b, c in zip(self.buckets, h["counts"]):
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, ('le', b))} {c}")
+        lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, ('le', '+Inf'))} {h['count']}")
+        lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {h['sum']}")
+        lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {h['count']}")
+        return lines
+
+
+REGISTRY = []
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def render():
+    lines = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = _register(Histogram(
+    "recallbox_stage_seconds", "Time spent in each pipeline stage", ("pipeline", "stage")))
+HTTP_SECONDS = _register(Histogram(
+    "recallbox_http_request_seconds", "HTTP request latency", ("method", "route", "status")))
+SCAN_FILES = _register(Counter(
+    "recallbox_scan_files_total", "Files seen by scan_and_index", ("outcome",)))
+VISION_REQUESTS = _register(Counter(
+    "recallbox_vision_requests_total", "Vision endpoint calls by HTTP status", ("kind", "status")))
+SCAN_QUEUE_DEPTH = _register(Gauge(
+    "recallbox_scan_queue_depth", "Files still waiting to be processed by the running scan"))
+FAISS_NTOTAL = _register(Gauge(
+    "recallbox_faiss_ntotal", "Vectors in each loaded library's FAISS index", ("library",)))
+DB_SIZE_BYTES = _register(Gauge(
+    "recallbox_db_size_bytes", "Size of each library's .memory_index.db", ("library",)))
+LIBRARIES = _register(Gauge(
+    "recallbox_libraries", "Mounted libraries by load state", ("state",)))
+SEARCH_CACHE_ENTRIES = _register(Gauge(
+    "recallbox_search_cache_entries", "Cached searches available for cursor continuation"))
+
+
+@contextmanager
+def span(pipeline, stage):
+    """Time a block into recallbox_stage_seconds{pipeline, stage}."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, pipeline=pipeline, stage=stage)
+        if TRACE:
+            print(json.dumps({"span": f"{pipeline}.{stage}", "seconds": round(elapsed, 6), "ts": time.time()}))
@@ -0,0 +1,108 @@
+# app/paging.py
+import json
+import time
+import uuid
+import base64
+from collections import OrderedDict
+
+BROWSE_COLUMNS = "file_id, path, created_at, exif_date, memory_summary, tags, vision_status"
+# How many search results to pull from FAISS up front, in pages of top_k
+SEARCH_PREFETCH_PAGES = 5
+SEARCH_CACHE_SIZE = 64
+SEARCH_CACHE_TTL = 10 * 60
+
+
+def encode_cursor(data: dict):
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: str):
+    """The dict encoded in `cursor`, or None if it isn't one of ours."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+def cursor_after(cur):
+    """The keyset position (sort value, id) stored in a browse cursor, or None if malformed."""
+    return keyset_position(cur.get("after") if cur else None)
+
+def keyset_position(after):
+    """`after` if it is a valid [sort value, id] pair, else None."""
+    if not isinstance(after, list) or len(after) != 2:
+        return None
+    if not isinstance(after[0], str) or not isinstance(after[1], (str, int)) or isinstance(after[1], bool):
+        return None
+    return after
+
+def cursor_offset(cur):
+    """The result offset stored in a search cursor, or None if malformed."""
+    offset = cur.get("offset") if cur else None
+    if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+        return None
+    return offset
+
+
+def browse_page(conn, limit, after=None, descending=True, date_from=None, date_to=None):
+    """
+    One keyset page of memories ordered by (exif_date, file_id), served from idx_exif_date.
+    `after` is the (exif_date, file_id) of the last row of the previous page.
+    """
+    op, order = ("<", "DESC") if descending else (">", "ASC")
+    where = ["exif_date IS NOT NULL"]
+    params = []
+    if after:
+        where.append(f"(exif_date, file_id) {op} (?, ?)")
+        params.extend(after)
+    if date_from:
+        where.append("exif_date >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("exif_date <= ?")
+        params.append(date_to)
+    c = conn.cursor()
+    c.execute(
+        f"SELECT {BROWSE_COLUMNS} FROM memories WHERE {' AND '.join(where)} "
+        f"ORDER BY exif_date {order}, file_id {order} LIMIT ?",
+        (*params, limit),
+    )
+    return c.fetchall()
+
+
+class SearchCache:
+    """
+    Small LRU of recent searches so cursor continuation can page through the
+    already-ranked result list without re-expanding or re-encoding the query.
+    """
+
+    def __init__(self, size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def put(self, entry: dict):
+        sid = uuid.uuid4().hex
+        entry["created"] = time.time()
+        self.entries[sid] = entry
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return sid
+
+    def get(self, sid):
+        entry = self.entries.get(sid)
+        if entry is None:
+            return None
+        if time.time() - entry["created"] > self.ttl:
+            del self.entries[sid]
+            return None
+        self.entries.move_to_end(sid)
+        return entry
+
+
+def ndjson_lines(items, tail=None):
+    """Yield one JSON document per line; `tail` (e.g. the next cursor) goes last."""
+    for item in items:
+        yield json.dumps(item) + "\n"
+    if tail is not None:
+        yield json.dumps(tail) + "\n"
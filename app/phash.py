@@ -0,0 +1,172 @@
+# app/phash.py
+import io
+import numpy as np
+from PIL import Image
+
+# Max Hamming distance (out of 64 bits) for two images to count as near-duplicates when
+# browsing or collapsing results. Resized / re-encoded copies land at 0-2, burst shots
+# usually under 6, but unrelated images collide at 3-5 often enough that this is too
+# loose to copy analysis across.
+NEAR_DUP_DISTANCE = 5
+# Reusing another file's OCR/vision/embedding needs a tighter 64-bit match that also
+# passes verify_near_duplicate() on the two thumbnails.
+REUSE_DISTANCE = 2
+# Verification: 256-bit dHash distance, mean absolute RGB difference on an 8x8 grid
+# (0-255) and relative aspect-ratio difference.
+VERIFY_DHASH_DISTANCE = 16
+VERIFY_COLOR_DIFF = 6.0
+VERIFY_ASPECT_DIFF = 0.02
+
+def _dhash_bits(im: Image.Image, size):
+    g = im.convert("L").resize((size + 1, size), Image.BILINEAR)
+    px = np.asarray(g, dtype=np.int16)
+    return (px[:, 1:] > px[:, :-1]).flatten()
+
+def dhash(im: Image.Image, size=8):
+    """64-bit difference hash as a 16-char hex string."""
+    bits = _dhash_bits(im, size)
+    value = 0
+    for b in bits:
+        value = (value << 1) | int(b)
+    return f"{value:0{size * size // 4}x}"
+
+def dhash_bytes(data: bytes):
+    try:
+        return dhash(Image.open(io.BytesIO(data)))
+    except Exception:
+        return None
+
+def hamming(a: str, b: str):
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+def verify_near_duplicate(thumb_a: bytes, thumb_b: bytes):
+    """
+    Second check before one image's analysis is reused for another: same aspect ratio,
+    a 16x16 dHash within VERIFY_DHASH_DISTANCE and the same colours on a coarse grid.
+    The 64-bit hash ignores colour entirely, so this is what rules out look-alike layouts.
+    """
+    try:
+        a = Image.open(io.BytesIO(thumb_a))
+        b = Image.open(io.BytesIO(thumb_b))
+        if abs(a.width / a.height - b.width / b.height) > VERIFY_ASPECT_DIFF * (a.width / a.height):
+            return False
+        if int((_dhash_bits(a, 16) != _dhash_bits(b, 16)).sum()) > VERIFY_DHASH_DISTANCE:
+            return False
+        ca = np.asarray(a.convert("RGB").resize((8, 8), Image.BILINEAR), dtype=np.float32)
+        cb = np.asarray(b.convert("RGB").resize((8, 8), Image.BILINEAR), dtype=np.float32)
+        return float(np.abs(ca - cb).mean()) <= VERIFY_COLOR_DIFF
+    except Exception:
+        return False
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over hex hashes with Hamming distance.
+    Lookups only visit children whose edge distance is within +/- max_dist of the query.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, h, item):
+        node = (h, item, {})
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        cur = self.root
+        while True:
+            d = hamming(h, cur[0])
+            child = cur[2].get(d)
+            if child is None:
+                cur[2][d] = node
+                return
+            cur = child
+
+    def find(self, h, max_dist=NEAR_DUP_DISTANCE):
+        """Return [(distance, item)] within max_dist, closest first."""
+        out = []
+        if self.root is None:
+            return out
+        stack = [self.root]
+        while stack:
+            node_h, item, children = stack.pop()
+            d = hamming(h, node_h)
+            if d <= max_dist:
+                out.append((d, item))
+            # Snapshot: another library's scan may add to a tree used here as a reuse donor
+            for edge, child in list(children.items()):
+                if d - max_dist <= edge <= d + max_dist:
+                    stack.append(child)
+        out.sort(key=lambda x: x[0])
+        return out
+
+    @classmethod
+    def from_db(cls, conn):
+        tree = cls()
+        c = conn.cursor()
+        c.execute("SELECT file_id, phash FROM memories WHERE phash IS NOT NULL")
+        for fid, h in c.fetchall():
+            tree.add(h, fid)
+        return tree
+
+
+def backfill_phashes(conn, batch=500):
+    """
+    Compute phash for rows indexed before phash existed, from their stored thumbnail.
+    Pages by rowid so only `batch` thumbnails are in memory at once; each batch is
+    committed separately. Returns the number of rows hashed.
+    """
+    c = conn.cursor()
+    hashed = 0
+    last_rowid = 0
+    while True:
+        c.execute("SELECT rowid, file_id, thumbnail FROM memories WHERE rowid > ? AND phash IS NULL AND thumbnail IS NOT NULL ORDER BY rowid LIMIT ?",
+                  (last_rowid, batch))
+        rows = c.fetchall()
+        if not rows:
+            break
+        last_rowid = rows[-1][0]
+        updates = []
+        for _, fid, thumb in rows:
+            h = dhash_bytes(thumb)
+            if h:
+                updates.append((h, fid))
+        if updates:
+            c.executemany("UPDATE memories SET phash=? WHERE file_id=?", updates)
+            conn.commit()
+            hashed += len(updates)
+    return hashed
+
+
+def duplicate_clusters(conn, max_dist=NEAR_DUP_DISTANCE):
+    """
+    Group memories of one library into near-duplicate clusters (union-find over BK-tree
+    neighbours). Copies on different drives are not clustered together here.
+    """
+    c = conn.cursor()
+    c.execute("SELECT file_id, phash FROM memories WHERE phash IS NOT NULL")
+    rows = c.fetchall()
+    tree = BKTree()
+    for fid, h in rows:
+        tree.add(h, fid)
+
+    parent = {fid: fid for fid, _ in rows}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for fid, h in rows:
+        for _, other in tree.find(h, max_dist):
+            ra, rb = find(fid), find(other)
+            if ra != rb:
+                parent[rb] = ra
+
+    groups = {}
+    for fid, _ in rows:
+        groups.setdefault(find(fid), []).append(fid)
+    return [g for g in groups.values() if len(g) > 1]
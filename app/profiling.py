@@ -0,0 +1,61 @@
+# app/profiling.py
+"""
+On-demand profiling of a single request or scan. Uses pyinstrument when installed
+(HTML report, async-aware), otherwise the stdlib cProfile (.prof, open with snakeviz).
+"""
+import os
+import io
+import time
+import pstats
+import cProfile
+from pathlib import Path
+from contextlib import contextmanager
+
+# Per-request profiling via the X-Profile header is off unless this is set
+ALLOW_REQUEST_PROFILING = os.environ.get("RECALLBOX_ALLOW_PROFILE") == "1"
+PROFILE_DIR = Path(os.environ.get("RECALLBOX_PROFILE_DIR", "profiles"))
+
+
+def _out_path(label, ext):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    safe = "".join(ch if ch.isalnum() else "_" for ch in label).strip("_") or "run"
+    return PROFILE_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{safe}.{ext}"
+
+
+@contextmanager
+def profile(label, engine=None):
+    """
+    Profile the enclosed block. Yields a dict that receives `path` (report file)
+    and, for cProfile, `top` (cumulative-time summary) once the block exits.
+    """
+    result = {}
+    use_pyinstrument = engine != "cprofile"
+    if use_pyinstrument:
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            use_pyinstrument = False
+
+    if use_pyinstrument:
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            path = _out_path(label, "html")
+            path.write_text(profiler.output_html())
+            result["path"] = str(path)
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            path = _out_path(label, "prof")
+            profiler.dump_stats(str(path))
+            buf = io.StringIO()
+            pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(25)
+            result["path"] = str(path)
+            result["top"] = buf.getvalue()
@@ -0,0 +1,175 @@
+# app/reembed.py
+"""
+Offline bulk re-embedding of a library with a new embedding model.
+
+    python -m app.reembed /photos --model all-mpnet-base-v2 --workers 4
+
+Only the stored memory_summary / tags / ocr_text are re-encoded; no hashing, OCR or
+vision calls are repeated. Vectors are written to embedding_versions under the new
+model name as the job goes, so an interrupted run resumes where it stopped. When every
+memory has a vector, a single transaction snapshots the current vectors as the old
+model's version, copies the new ones into memories.embedding and records the new
+model/dim. Swapping back to a previous model is then just another (instant) swap.
+
+Restart the server with RECALLBOX_EMBED_MODEL set to the new model, or call
+POST /libraries/reload if it already uses it. A scan that rewrites a memory drops its
+stored versions, so a later run re-encodes it from the new text.
+"""
+import os
+import time
+import argparse
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from .db import init_db, get_setting
+from .library import DB_FILENAME
+from .vectors import encode_vector, DEFAULT_VECTOR_FORMAT
+from .embedding import embedding_text, load_sentence_model, EMBED_BACKEND, LEGACY_MODEL_NAME, LEGACY_EMBED_DIM
+
+READ_BATCH = 8192
+ENCODE_CHUNK = 512
+
+_worker_model = None
+
+
+def _init_worker(model_name, backend, threads):
+    global _worker_model
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    _worker_model = load_sentence_model(model_name, backend)
+
+
+def _encode_chunk(file_ids, texts, batch_size):
+    vecs = _worker_model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    return file_ids, vecs.astype("float32")
+
+
+def pending_rows(conn, model_name, batch=READ_BATCH):
+    """Yield lists of (file_id, text) for memories without a `model_name` vector, keyset-paged by rowid."""
+    c = conn.cursor()
+    last_rowid = 0
+    while True:
+        c.execute("""
+            SELECT m.rowid, m.file_id, m.caption, m.memory_summary, m.tags, m.ocr_text, m.vision_status
+            FROM memories m
+            WHERE m.rowid > ? AND NOT EXISTS (
+                SELECT 1 FROM embedding_versions v WHERE v.model = ? AND v.file_id = m.file_id
+            )
+            ORDER BY m.rowid LIMIT ?
+        """, (last_rowid, model_name, batch))
+        rows = c.fetchall()
+        if not rows:
+            return
+        last_rowid = rows[-1][0]
+        yield [(fid, embedding_text(caption, summary, tags, ocr, status))
+               for _, fid, caption, summary, tags, ocr, status in rows]
+
+
+def swap_embeddings(conn, model_name, dim):
+    """Atomically make `model_name` the active embedding model of this library."""
+    old_model = get_setting(conn, "embed_model", LEGACY_MODEL_NAME)
+    old_dim = get_setting(conn, "embed_dim", str(LEGACY_EMBED_DIM))
+    with conn:
+        # Keep the outgoing vectors so a rollback needs no re-encoding
+        if old_model != model_name:
+            conn.execute("""
+                INSERT OR REPLACE INTO embedding_versions (model, file_id, vector)
+                SELECT ?, file_id, embedding FROM memories WHERE embedding IS NOT NULL
+            """, (old_model,))
+        conn.execute("""
+            UPDATE memories SET embedding = (
+                SELECT v.vector FROM embedding_versions v WHERE v.model = ? AND v.file_id = memories.file_id
+            )
+            WHERE EXISTS (SELECT 1 FROM embedding_versions v WHERE v.model = ? AND v.file_id = memories.file_id)
+        """, (model_name, model_name))
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('embed_model', ?)", (model_name,))
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('embed_dim', ?)", (str(dim),))
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('embed_model_previous', ?)", (old_model,))
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('embed_dim_previous', ?)", (old_dim,))
+
+
+def reembed_library(root, model_name, backend=EMBED_BACKEND, workers=None, encode_batch=64, swap=True):
+    """Re-embed every memory in the library at `root` with `model_name`. Returns a stats dict."""
+    conn = init_db(str(Path(root).joinpath(DB_FILENAME)))
+    vector_format = get_setting(conn, "vector_format", DEFAULT_VECTOR_FORMAT)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    t0 = time.perf_counter()
+    written = 0
+
+    dim = None
+
+    def store(file_ids, vecs):
+        nonlocal written, dim
+        dim = int(vecs.shape[1])
+        conn.executemany("INSERT OR REPLACE INTO embedding_versions (model, file_id, vector) VALUES (?, ?, ?)",
+                         [(model_name, fid, encode_vector(v, vector_format)) for fid, v in zip(file_ids, vecs)])
+        conn.commit()
+        written += len(file_ids)
+        rate = written / (time.perf_counter() - t0)
+        print(f"re-embed: {written} vectors ({rate:.0f}/s)")
+
+    if workers <= 1:
+        model = load_sentence_model(model_name, backend)
+        dim = int(model.get_sentence_embedding_dimension())
+        for batch in pending_rows(conn, model_name):
+            fids = [fid for fid, _ in batch]
+            vecs = model.encode([t for _, t in batch], batch_size=encode_batch, show_progress_bar=False)
+            store(fids, vecs.astype("float32"))
+    else:
+        # Split CPU threads between workers so they don't oversubscribe the cores
+        threads = max(1, (os.cpu_count() or workers) // workers)
+        # Spawned, not forked: a forked child inherits torch's thread pools and locks.
+        # The parent never loads the model; dim comes from the first encoded chunk.
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(model_name, backend, threads)) as pool:
+            in_flight = set()
+            for batch in pending_rows(conn, model_name):
+                for i in range(0, len(batch), ENCODE_CHUNK):
+                    chunk = batch[i:i + ENCODE_CHUNK]
+                    in_flight.add(pool.submit(_encode_chunk, [f for f, _ in chunk], [t for _, t in chunk], encode_batch))
+                    # Bounded queue: reading never runs far ahead of encoding
+                    while len(in_flight) >= workers * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for fut in done:
+                            store(*fut.result())
+            for fut in in_flight:
+                store(*fut.result())
+
+    # Rows scanned while the job ran are picked up by re-running; only swap a complete set
+    c = conn.cursor()
+    c.execute("""SELECT COUNT(1) FROM memories m WHERE NOT EXISTS (
+                     SELECT 1 FROM embedding_versions v WHERE v.model = ? AND v.file_id = m.file_id)""", (model_name,))
+    missing = c.fetchone()[0]
+    swapped = False
+    if swap and missing == 0:
+        if dim is None:
+            # Nothing was left to encode on this run (an earlier one finished)
+            dim = int(load_sentence_model(model_name, backend).get_sentence_embedding_dimension())
+        swap_embeddings(conn, model_name, dim)
+        swapped = True
+    conn.close()
+    return {"model": model_name, "dim": dim, "written": written, "missing": missing,
+            "swapped": swapped, "seconds": time.perf_counter() - t0}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-embed a RecallBox library with a new model")
+    ap.add_argument("path", help="mounted folder containing .memory_index.db")
+    ap.add_argument("--model", required=True, help="sentence-transformers model name")
+    ap.add_argument("--backend", default=EMBED_BACKEND, help="torch | torch-int8 | onnx | onnx-int8")
+    ap.add_argument("--workers", type=int, default=None, help="encoder processes (default: CPU count, 1 = in-process)")
+    ap.add_argument("--batch-size", type=int, default=64, help="sentences per model forward pass")
+    ap.add_argument("--no-swap", action="store_true", help="write the new vectors but keep the current model active")
+    args = ap.parse_args()
+    stats = reembed_library(args.path, args.model, args.backend, args.workers, args.batch_size, swap=not args.no_swap)
+    print(stats)
+    if stats["swapped"]:
+        print(f"Now serve with RECALLBOX_EMBED_MODEL={stats['model']}")
+    elif stats["missing"]:
+        print(f"{stats['missing']} memories still lack vectors; run again to finish before swapping.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# app/vectors.py
+"""
+Embedding storage codecs.
+
+Blobs are self-describing by length for a known dimension: dim*4 bytes is float32,
+dim*2 is float16 and dim+4 is int8. A DB can therefore hold a mix while it is being
+migrated, and readers never need a per-row format column.
+
+int8 is symmetric scalar quantization with a per-vector scale: a float32 max-abs prefix
+followed by dim int8 codes. Components of a unit 384-d embedding rarely exceed 0.3, so
+a fixed [-1, 1] range would leave most of the 8-bit range unused. Blobs of exactly dim
+bytes are the older fixed-scale int8 encoding; they still decode and are rewritten by
+migrate_embeddings.
+"""
+import os
+import numpy as np
+
+VECTOR_FORMATS = ("float32", "float16", "int8")
+# Format for new vectors when a library has no explicit setting
+DEFAULT_VECTOR_FORMAT = os.environ.get("RECALLBOX_VECTOR_STORAGE", "float32")
+INT8_LEVELS = 127.0
+# Scale of the original fixed-range int8 blobs (no prefix)
+LEGACY_INT8_SCALE = 127.0
+
+
+def encode_vector(vec, fmt=DEFAULT_VECTOR_FORMAT):
+    arr = np.asarray(vec, dtype=np.float32).reshape(-1)
+    if fmt == "float32":
+        return arr.tobytes()
+    if fmt == "float16":
+        return arr.astype(np.float16).tobytes()
+    if fmt == "int8":
+        peak = float(np.abs(arr).max()) if arr.size else 0.0
+        scale = peak / INT8_LEVELS if peak > 0 else 1.0
+        codes = np.clip(np.rint(arr / scale), -127, 127).astype(np.int8)
+        return np.float32(scale).tobytes() + codes.tobytes()
+    raise ValueError(f"Unknown vector format: {fmt}")
+
+
+def blob_format(blob, dim):
+    n = len(blob)
+    if n == dim * 4:
+        return "float32"
+    if n == dim * 2:
+        return "float16"
+    if n == dim + 4:
+        return "int8"
+    if n == dim:
+        return "int8-fixed"
+    return None
+
+
+def decode_vector(blob, dim):
+    """float32 vector from a stored blob, or None if the blob doesn't match `dim` in any format."""
+    if not blob:
+        return None
+    fmt = blob_format(blob, dim)
+    if fmt == "float32":
+        return np.frombuffer(blob, dtype=np.float32)
+    if fmt == "float16":
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if fmt == "int8":
+        scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=4).astype(np.float32) * scale
+    if fmt == "int8-fixed":
+        return np.frombuffer(blob, dtype=np.int8).astype(np.float32) / LEGACY_INT8_SCALE
+    return None
+
+
+def migrate_embeddings(conn, fmt, dim, batch=5000):
+    """
+    Re-encode every stored embedding to `fmt` in place, in batches of `batch` rows
+    committed separately so a large DB never holds one huge transaction.
+    Returns the number of rows rewritten.
+    """
+    if fmt not in VECTOR_FORMATS:
+        raise ValueError(f"Unknown vector format: {fmt}")
+    c = conn.cursor()
+    rewritten = 0
+    last_rowid = 0
+    while True:
+        c.execute("SELECT rowid, embedding FROM memories WHERE rowid > ? AND embedding IS NOT NULL ORDER BY rowid LIMIT ?",
+                  (last_rowid, batch))
+        rows = c.fetchall()
+        if not rows:
+            break
+        last_rowid = rows[-1][0]
+        updates = []
+        for rowid, blob in rows:
+            if blob_format(blob, dim) == fmt:
+                continue
+            vec = decode_vector(blob, dim)
+            if vec is not None:
+                updates.append((encode_vector(vec, fmt), rowid))
+        if updates:
+            c.executemany("UPDATE memories SET embedding=? WHERE rowid=?", updates)
+            conn.commit()
+            rewritten += len(updates)
+    return rewritten
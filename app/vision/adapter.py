@@ -3,6 +3,7 @@ import base64
 import httpx
 from typing import Optional, Dict, Any
 from .contract import VisionOutput
+from ..metrics import VISION_REQUESTS
 
 class VisionAdapter:
     def __init__(self, endpoint_url: str, model_name: str, api_key: str = "lm-studio"):
@@ -49,6 +50,7 @@ class VisionAdapter:
                     headers=headers,
                     json=payload
                 )
+                VISION_REQUESTS.inc(kind="analyze", status=response.status_code)
 
                 if response.status_code != 200:
                     print(f"Vision API Error: {response.status_code} - {response.text}")
@@ -75,6 +77,7 @@ class VisionAdapter:
 
         except Exception as e:
             print(f"Vision Adapter Error: {e}")
+            VISION_REQUESTS.inc(kind="analyze", status="error")
             return None
 
     async def expand_query(self, query: str) -> str:
@@ -103,12 +106,14 @@ class VisionAdapter:
                     headers=headers,
                     json=payload
                 )
+                VISION_REQUESTS.inc(kind="expand", status=response.status_code)
 
                 if response.status_code == 200:
                     data = response.json()
                     return data["choices"][0]["message"]["content"].strip()
                 return query
         except Exception:
+            VISION_REQUESTS.inc(kind="expand", status="error")
             return query
 
     def _build_payload(self, base64_image, system_prompt, user_prompt):
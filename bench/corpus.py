@@ -0,0 +1,51 @@
+# bench/corpus.py
+import random
+from pathlib import Path
+from datetime import datetime, timedelta
+from PIL import Image, ImageDraw
+
+WORDS = ["beach", "receipt", "coffee", "birthday", "cards", "mountain", "dinner", "train",
+         "invoice", "garden", "concert", "dog", "snow", "market", "office", "bridge"]
+
+def _exif_with_date(dt: datetime):
+    exif = Image.Exif()
+    # 36867 = DateTimeOriginal, read back by indexer.get_exif_date
+    exif[36867] = dt.strftime("%Y:%m:%d %H:%M:%S")
+    return exif
+
+def make_image(rng: random.Random, text: str, size=(640, 480)):
+    im = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(im)
+    for _ in range(rng.randint(3, 8)):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randint(20, 200), y0 + rng.randint(20, 200)
+        draw.rectangle([x0, y0, x1, y1], fill=tuple(rng.randrange(256) for _ in range(3)))
+    draw.rectangle([20, 20, 420, 70], fill=(255, 255, 255))
+    draw.text((30, 35), text, fill=(0, 0, 0))
+    return im
+
+def generate_corpus(out_dir: Path, n: int, seed: int = 0, dup_rate: float = 0.1):
+    """
+    Write `n` synthetic JPEGs with EXIF dates and rendered text into out_dir.
+    A `dup_rate` fraction are resized / re-encoded copies of earlier images, to
+    exercise near-duplicate reuse. Returns the list of written paths.
+    """
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    start = datetime(2015, 1, 1)
+    paths = []
+    for i in range(n):
+        dt = start + timedelta(minutes=rng.randrange(60 * 24 * 365 * 8))
+        p = out_dir / f"img_{i:07d}.jpg"
+        if paths and rng.random() < dup_rate:
+            src = Image.open(rng.choice(paths))
+            scale = rng.uniform(0.5, 0.9)
+            im = src.resize((int(src.width * scale), int(src.height * scale)))
+            quality = rng.randint(60, 85)
+        else:
+            text = " ".join(rng.choice(WORDS) for _ in range(3)) + f" #{i}"
+            im = make_image(rng, text)
+            quality = 90
+        im.convert("RGB").save(p, format="JPEG", quality=quality, exif=_exif_with_date(dt))
+        paths.append(p)
+    return paths
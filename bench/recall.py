@@ -0,0 +1,100 @@
+# bench/recall.py
+"""
+Recall and memory of the float16 / int8 vector storage options against exact float32.
+
+    python -m bench.recall --db /photos/.memory_index.db --queries 500 --k 12
+    python -m bench.recall --synthetic 100000
+
+Each format goes through the same path as production: the stored blob round-trip
+(app.vectors) followed by the FaissManager index for that format.
+"""
+import json
+import time
+import argparse
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from app.db import get_setting
+from app.embedding import LEGACY_EMBED_DIM
+from app.faiss_mgr import FaissManager
+from app.vectors import VECTOR_FORMATS, encode_vector, decode_vector
+
+
+def load_vectors(db_path):
+    """The library's vectors, decoded at the size its settings record."""
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    dim = int(get_setting(conn, "embed_dim", str(LEGACY_EMBED_DIM)))
+    vecs = []
+    for (blob,) in conn.execute("SELECT embedding FROM memories WHERE embedding IS NOT NULL"):
+        v = decode_vector(blob, dim)
+        if v is not None:
+            vecs.append(v)
+    conn.close()
+    if not vecs:
+        raise SystemExit(f"No {dim}-d embeddings in {db_path}")
+    return np.vstack(vecs).astype("float32")
+
+
+def synthetic_vectors(n, dim, rng):
+    vecs = rng.standard_normal((n, dim)).astype("float32")
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def evaluate(base, queries, k):
+    dim = base.shape[1]
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(base)
+    _, truth = exact.search(queries, k)
+
+    out = {}
+    for fmt in VECTOR_FORMATS:
+        stored = np.vstack([decode_vector(encode_vector(v, fmt), dim) for v in base])
+        # The blob codec on its own, searched exactly, to separate its loss from the index's
+        codec_only = faiss.IndexFlatL2(dim)
+        codec_only.add(stored)
+        _, codec_got = codec_only.search(queries, k)
+        fm = FaissManager(dim, fmt)
+        fm._ensure_trained(stored)
+        fm.index.add(stored)
+        t0 = time.perf_counter()
+        _, got = fm.index.search(queries, k)
+        elapsed = time.perf_counter() - t0
+        hits = sum(len(set(t) & set(g)) for t, g in zip(truth, got))
+        out[fmt] = {
+            f"recall@{k}": hits / (len(queries) * k),
+            f"codec_recall@{k}": sum(len(set(t) & set(g)) for t, g in zip(truth, codec_got)) / (len(queries) * k),
+            "top1_agreement": float(np.mean(truth[:, 0] == got[:, 0])),
+            "blob_bytes_per_vector": len(encode_vector(base[0], fmt)),
+            "index_bytes": int(faiss.serialize_index(fm.index).nbytes),
+            "search_ms_per_query": elapsed * 1000.0 / len(queries),
+        }
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Vector storage recall comparison")
+    ap.add_argument("--db", help="use embeddings from an existing .memory_index.db")
+    ap.add_argument("--synthetic", type=int, default=50000, help="random unit vectors when --db is not given")
+    ap.add_argument("--dim", type=int, default=LEGACY_EMBED_DIM, help="size of the synthetic vectors")
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=12)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="bench_recall.json")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    base = load_vectors(args.db) if args.db else synthetic_vectors(args.synthetic, args.dim, rng)
+    # Queries are perturbed copies of stored vectors, like a query that matches a photo well
+    picks = base[rng.integers(len(base), size=args.queries)]
+    queries = picks + rng.standard_normal(picks.shape).astype("float32") * 0.05
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    results = {"config": vars(args), "vectors": len(base), "formats": evaluate(base, queries.astype("float32"), args.k)}
+    Path(args.out).write_text(json.dumps(results, indent=2))
+    print(json.dumps(results["formats"], indent=2))
+
+if __name__ == "__main__":
+    main()
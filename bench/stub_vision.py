@@ -0,0 +1,112 @@
+# bench/stub_vision.py
+"""
+Minimal OpenAI-compatible endpoint standing in for the vision LLM during benchmarks.
+Run standalone: python -m bench.stub_vision --port 8765 --latency 0.5 --error-rate 0.05
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+VISION_REPLY = {
+    "summary": "A synthetic benchmark photo with coloured blocks and a caption.",
+    "description": "Several coloured rectangles on a plain background with a white text box.",
+    "activity": "none",
+    "setting": "indoor",
+    "social_context": "none",
+    "objects": ["rectangle", "text", "background"],
+    "people_count": 0,
+    "text_content": "benchmark",
+    "weather": "n/a",
+    "time_of_day": "day",
+}
+
+
+class StubVisionServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "errors": 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/v1/models":
+                    return self._send(200, {"data": [{"id": "stub-vision"}]})
+                self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with server.lock:
+                    server.counts["requests"] += 1
+                    delay = max(0.0, server.rng.gauss(server.latency, server.jitter)) if server.jitter else server.latency
+                    fail = server.rng.random() < server.error_rate
+                    if fail:
+                        server.counts["errors"] += 1
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    return self._send(500, {"error": "stub injected failure"})
+                user = payload.get("messages", [{}])[-1].get("content")
+                # Image requests carry a content list; plain strings are query expansion
+                if isinstance(user, list):
+                    content = json.dumps(VISION_REPLY)
+                else:
+                    content = f"A photo showing {user}"
+                self._send(200, {"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stub OpenAI-compatible vision server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    ap.add_argument("--jitter", type=float, default=0.0, help="stddev of latency, seconds")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    srv = StubVisionServer(args.host, args.port, args.latency, args.jitter, args.error_rate)
+    print(f"Stub vision server on {srv.url}")
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
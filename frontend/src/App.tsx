@@ -17,7 +17,9 @@ type ViewMode = 'grid' | 'timeline' | 'chronicle';
 function App() {
   const [mountedPath, setMountedPath] = useState<string | null>(null);
   const [memories, setMemories] = useState<Memory[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedMemoryId, setSelectedMemoryId] = useState<string | null>(null);
   const [viewMode, setViewMode] = useState<ViewMode>('grid');
   const [showConfig, setShowConfig] = useState(false);
@@ -41,6 +43,7 @@ function App() {
   const handleMount = (path: string) => {
     setMountedPath(path);
     setMemories([]);
+    setNextCursor(null);
     setSelectedForChronicle([]);
     setViewMode('grid');
     setLastQuery('');
@@ -53,6 +56,7 @@ function App() {
     try {
       const res = await memoryApi.searchMemories(query, 50, from, to); // Increased top_k for better demo
       setMemories(res.results);
+      setNextCursor(res.next_cursor ?? null);
     } catch (err) {
       console.error(err);
       alert('Search failed. Ensure backend is running.');
@@ -61,6 +65,23 @@ function App() {
     }
   };
 
+  // Continue the same ranked search from where the last page stopped
+  const handleLoadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const res = await memoryApi.searchMore(nextCursor, 50);
+      setMemories(prev => [...prev, ...res.results]);
+      setNextCursor(res.next_cursor ?? null);
+    } catch (err) {
+      console.error(err);
+      // Cursor expired (410) or backend gone; a new search starts over
+      setNextCursor(null);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleFilterChange = (from?: string, to?: string) => {
     setDateFilters({ from, to });
     if (lastQuery) {
@@ -216,6 +237,18 @@ function App() {
             />
           )}
 
+          {viewMode !== 'chronicle' && nextCursor && !loading && (
+            <div className="flex justify-center mt-8">
+              <button
+                onClick={handleLoadMore}
+                disabled={loadingMore}
+                className="px-4 py-2 rounded-md text-sm font-medium bg-white border border-gray-200 text-gray-700 hover:bg-gray-50 disabled:opacity-50"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
+
           {viewMode === 'chronicle' && (
              <ChronicleView
                selectedMemories={selectedForChronicle.length > 0 ? selectedForChronicle : memories}
@@ -233,6 +266,7 @@ function App() {
       {selectedMemoryId && (
         <MemoryDetail
           memoryId={selectedMemoryId}
+          library={memories.find(m => m.file_id === selectedMemoryId)?.library}
           thumbnailB64={memories.find(m => m.file_id === selectedMemoryId)?.thumbnail_b64}
           onClose={() => setSelectedMemoryId(null)}
         />
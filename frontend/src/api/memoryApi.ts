@@ -12,6 +12,7 @@ export interface Memory {
   exif_date?: string;
   thumbnail_b64?: string;
   created_at?: string;
+  library?: string;
 }
 
 export interface MemoryDetail {
@@ -27,10 +28,12 @@ export interface MemoryDetail {
   tags: string;
   vision_json?: string;
   vision_status?: string;
+  library?: string;
 }
 
 export interface SearchResponse {
   results: Memory[];
+  next_cursor?: string | null;
 }
 
 export interface ScanResponse {
@@ -103,8 +106,24 @@ export const memoryApi = {
     return res.json();
   },
 
-  async getMemory(file_id: string): Promise<MemoryDetail> {
-    const res = await fetch(`${API_BASE}/memory/${file_id}`);
+  async searchMore(cursor: string, top_k: number = 12): Promise<SearchResponse> {
+    const res = await fetch(`${API_BASE}/search`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ cursor, top_k }),
+    });
+    if (!res.ok) {
+      const err = await res.json();
+      throw new Error(err.detail || 'Search failed');
+    }
+    return res.json();
+  },
+
+  // Pass the result's `library` so the backend doesn't have to probe every mounted drive
+  async getMemory(file_id: string, library?: string): Promise<MemoryDetail> {
+    const params = new URLSearchParams();
+    if (library) params.set('library', library);
+    const res = await fetch(`${API_BASE}/memory/${file_id}?${params}`);
     if (!res.ok) {
         const err = await res.json();
         throw new Error(err.detail || 'Get memory failed');
@@ -112,8 +131,10 @@ export const memoryApi = {
     return res.json();
   },
 
-  getThumbnailUrl(file_id: string): string {
-    return `${API_BASE}/thumbnail/${file_id}`;
+  getThumbnailUrl(file_id: string, library?: string): string {
+    const params = new URLSearchParams();
+    if (library) params.set('library', library);
+    return `${API_BASE}/thumbnail/${file_id}?${params}`;
   },
 
   // --- Vision Config ---
@@ -5,11 +5,12 @@ import { format } from 'date-fns';
 
 interface MemoryDetailProps {
   memoryId: string | null;
+  library?: string; // Mounted library the memory came from
   thumbnailB64?: string; // Fallback if full image fails or while loading
   onClose: () => void;
 }
 
-export const MemoryDetail: React.FC<MemoryDetailProps> = ({ memoryId, thumbnailB64, onClose }) => {
+export const MemoryDetail: React.FC<MemoryDetailProps> = ({ memoryId, library, thumbnailB64, onClose }) => {
   const [data, setData] = useState<MemoryDetailType | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
@@ -23,11 +24,11 @@ export const MemoryDetail: React.FC<MemoryDetailProps> = ({ memoryId, thumbnailB
     setError(null);
     setTab('info');
 
-    memoryApi.getMemory(memoryId)
+    memoryApi.getMemory(memoryId, library)
       .then(setData)
       .catch((err) => setError(err.message))
       .finally(() => setLoading(false));
-  }, [memoryId]);
+  }, [memoryId, library]);
 
   // Handle ESC key
   useEffect(() => {
@@ -0,0 +1,101 @@
+# tests/test_search_paging.py
+"""
+Cursor paging of /search across several libraries. Exact ties in distance are common
+with the float16 / int8 indexes, so the libraries here store only a few distinct
+vectors and every page boundary falls inside a run of tied scores.
+"""
+import uuid
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.db import init_db, set_setting
+from app.library import LibraryRegistry
+from app.paging import SearchCache
+from app.vectors import encode_vector
+from app.embedding import LEGACY_EMBED_DIM, MODEL_NAME
+
+DIM = LEGACY_EMBED_DIM
+
+
+class QueryModel:
+    def __init__(self, vec):
+        self.vec = vec
+
+    def encode(self, text, **kw):
+        return self.vec
+
+
+def _unit(rng):
+    v = rng.standard_normal(DIM).astype("float32")
+    return v / np.linalg.norm(v)
+
+
+def _make_library(path, distinct, n, fmt, rng):
+    path.mkdir()
+    conn = init_db(str(path / ".memory_index.db"))
+    set_setting(conn, "embed_model", MODEL_NAME)
+    set_setting(conn, "embed_dim", str(DIM))
+    set_setting(conn, "vector_format", fmt)
+    rows = []
+    for i in range(n):
+        rows.append((str(uuid.uuid4()), f"{path}/img_{i}.jpg", f"{path.name}-{i}", f"2020-01-{1 + i % 28:02d}T12:00:00",
+                     f"memory {i}", "test", "success", encode_vector(distinct[i % len(distinct)], fmt),
+                     f"{rng.integers(1 << 62):016x}"))
+    conn.executemany("""INSERT INTO memories (file_id, path, hash, exif_date, memory_summary, tags, vision_status, embedding, phash)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+    conn.commit()
+    conn.close()
+    return {r[0] for r in rows}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    distinct = [_unit(rng) for _ in range(3)]
+    ids = _make_library(tmp_path / "a", distinct, 25, "float32", rng)
+    ids |= _make_library(tmp_path / "b", distinct, 25, "int8", rng)
+
+    registry = LibraryRegistry(DIM, MODEL_NAME)
+    registry.mount(tmp_path / "a")
+    registry.mount(tmp_path / "b")
+    monkeypatch.setitem(main.state, "libraries", registry)
+    monkeypatch.setitem(main.state, "search_cache", SearchCache())
+    monkeypatch.setitem(main.state, "embed_model", QueryModel(distinct[0]))
+    monkeypatch.setattr(main, "SCORE_THRESHOLD", 100.0)
+    with TestClient(main.app) as c:
+        yield c, ids
+
+
+def _walk(client, **body):
+    seen = []
+    res = client.post("/search", json={"query": "q", "top_k": 4, **body}).json()
+    while True:
+        seen += [r["file_id"] for r in res["results"]]
+        if not res["next_cursor"]:
+            return seen
+        res = client.post("/search", json={"cursor": res["next_cursor"], "top_k": 4}).json()
+
+
+def test_cursor_walk_returns_every_result_once_with_tied_scores(client):
+    c, ids = client
+    seen = _walk(c)
+    assert len(seen) == len(set(seen))
+    assert set(seen) == ids
+
+
+def test_cursor_replay_is_idempotent_with_collapse(client):
+    c, _ = client
+    first = c.post("/search", json={"query": "q", "top_k": 4, "collapse_duplicates": True}).json()
+    cursor = first["next_cursor"]
+    assert cursor
+    again = [c.post("/search", json={"cursor": cursor, "top_k": 4}).json()["results"] for _ in range(2)]
+    assert [r["file_id"] for r in again[0]] == [r["file_id"] for r in again[1]]
+
+
+@pytest.mark.parametrize("top_k", [0, -3, None, 501])
+def test_search_rejects_bad_page_size(client, top_k):
+    c, _ = client
+    assert c.post("/search", json={"query": "q", "top_k": top_k}).status_code == 422